@@ -1,5 +1,20 @@
+import bisect
+import csv
+import functools
+import heapq
 import json
+import math
 import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import wave
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
@@ -9,11 +24,13 @@ from google.oauth2.service_account import Credentials
 import matplotlib.pyplot as plt
 import matplotlib
 import networkx as nx
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
 import numpy as np
 import requests
-from PIL import Image
+from PIL import Image, features
 import base64
+import hashlib
+import unicodedata
 
 # 한글 폰트 설정
 matplotlib.use('Agg')
@@ -59,6 +76,33 @@ st.markdown(pwa_html, unsafe_allow_html=True)
 
 _ = load_dotenv(find_dotenv())
 
+def get_config(key, default=None):
+    """설정값 조회 (Streamlit secrets 우선, 로컬 환경변수 대체)"""
+    try:
+        if key in st.secrets:
+            return st.secrets[key]
+    except Exception:
+        pass
+    return os.environ.get(key, default)
+
+# 실행(rerun)별 시작 구간 측정
+RERUN_STARTED_AT = time.perf_counter()
+startup_timings = {}
+
+def timed_startup(label, fn, *args):
+    """초기화 단계 실행 시간(ms)을 startup_timings에 기록"""
+    started = time.perf_counter()
+    result = fn(*args)
+    startup_timings[label] = (time.perf_counter() - started) * 1000
+    return result
+
+def get_config_flag(key, default=False):
+    """on/off 설정값 조회 (true/1/yes/on)"""
+    value = get_config(key, None)
+    if value is None:
+        return default
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
 # API 키 설정 (Streamlit Cloud 우선, 로컬 환경변수 대체)
 try:
     GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
@@ -72,20 +116,47 @@ except:
     HUGGINGFACE_API_KEY = os.environ.get("HUGGINGFACE_API_KEY", "")
 
 # Gemini 설정
+GEMINI_MODEL = get_config("GEMINI_MODEL", "")  # 지정 시 모델 목록 조회 생략
+GEMINI_MODEL_TTL = float(get_config("GEMINI_MODEL_TTL", 3600))  # 모델 재탐색 주기(초)
+GEMINI_TRANSPORT = get_config("GEMINI_TRANSPORT", "")  # "rest" 또는 "grpc" (기본값: SDK 기본)
+
+@st.cache_resource(ttl=GEMINI_MODEL_TTL, show_spinner=False)
+def init_gemini_model(api_key, pinned_model, transport):
+    """모델 탐색 및 생성 (프로세스 전역 캐시 - 매 실행마다 list_models를 호출하지 않음)"""
+    timings = {}
+    started = time.perf_counter()
+    if transport:
+        genai.configure(api_key=api_key, transport=transport)
+    else:
+        genai.configure(api_key=api_key)
+    timings['configure'] = (time.perf_counter() - started) * 1000
+    
+    model_name, source = pinned_model, "설정값"
+    if not model_name:
+        started = time.perf_counter()
+        try:
+            for m in genai.list_models():
+                if 'generateContent' in m.supported_generation_methods:
+                    model_name, source = m.name.replace('models/', ''), "자동 탐색"
+                    break
+        except:
+            pass
+        timings['list_models'] = (time.perf_counter() - started) * 1000
+    if not model_name:
+        model_name, source = 'gemini-pro', "기본값"
+    
+    started = time.perf_counter()
+    model = genai.GenerativeModel(model_name)
+    timings['construct'] = (time.perf_counter() - started) * 1000
+    
+    return {
+        'model': model, 'model_name': model_name, 'source': source,
+        'timings': timings, 'loaded_at': datetime.now().isoformat(timespec='seconds')
+    }
+
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    available_models = []
-    try:
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                available_models.append(m.name)
-        if available_models:
-            model_name = available_models[0].replace('models/', '')
-            model = genai.GenerativeModel(model_name)
-        else:
-            model = genai.GenerativeModel('gemini-pro')
-    except:
-        model = genai.GenerativeModel('gemini-pro')
+    gemini_setup = timed_startup("Gemini 모델", init_gemini_model, GEMINI_API_KEY, GEMINI_MODEL, GEMINI_TRANSPORT)
+    model, model_name = gemini_setup['model'], gemini_setup['model_name']
 else:
     st.error("🔑 GEMINI_API_KEY가 설정되지 않았습니다.")
     st.stop()
@@ -101,9 +172,25 @@ HUGGINGFACE_MODELS = [
     "prompthero/openjourney",  # 무료 티어에서 작동 가능
 ]
 
+HUGGINGFACE_RACE_WIDTH = int(get_config("HUGGINGFACE_RACE_WIDTH", 2))  # 동시에 요청하는 모델 수
+HUGGINGFACE_HEDGE_DELAY = float(get_config("HUGGINGFACE_HEDGE_DELAY", 5))  # 다음 모델을 추가로 보내기까지 대기(초), 0이면 한꺼번에
+HUGGINGFACE_COOLDOWN = float(get_config("HUGGINGFACE_COOLDOWN", 300))  # 503/404 모델을 건너뛰는 시간(초)
+
 # 대체 API (Pollinations.ai - 완전 무료, API 키 불필요)
 POLLINATIONS_API_URL = "https://image.pollinations.ai/prompt/"
 
+# 저장소 설정 ("sheets": Google Sheets, "sqlite": 로컬 SQLite)
+STORAGE_BACKEND = str(get_config("STORAGE_BACKEND", "sheets")).lower()
+LOCAL_DATA_DIR = get_config("LOCAL_DATA_DIR", "local_data")
+SQLITE_PATH = get_config("SQLITE_PATH", os.path.join(LOCAL_DATA_DIR, "emotion_diary.sqlite3"))
+STORAGE_LABEL = "💾 로컬" if STORAGE_BACKEND == "sqlite" else "☁️ 클라우드"
+
+SHEET_HEADERS = {
+    "diary_data": ['date', 'content', 'keywords', 'total_score', 'joy', 'sadness', 'anger', 'anxiety', 'calmness', 'message', 'created_at'],
+    "expert_advice": ['date', 'expert_type', 'advice', 'has_content', 'created_at'],
+    "metaphor_images": ['date', 'image_url', 'prompt', 'created_at']
+}
+
 # Google Sheets 연결
 @st.cache_resource
 def init_google_sheets():
@@ -116,14 +203,8 @@ def init_google_sheets():
         SPREADSHEET_ID = st.secrets["SPREADSHEET_ID"]
         spreadsheet = client.open_by_key(SPREADSHEET_ID)
         
-        worksheets = {
-            "diary_data": ['date', 'content', 'keywords', 'total_score', 'joy', 'sadness', 'anger', 'anxiety', 'calmness', 'message', 'created_at'],
-            "expert_advice": ['date', 'expert_type', 'advice', 'has_content', 'created_at'],
-            "metaphor_images": ['date', 'image_url', 'prompt', 'created_at']
-        }
-        
         sheets = {}
-        for name, headers in worksheets.items():
+        for name, headers in SHEET_HEADERS.items():
             try:
                 sheets[name] = spreadsheet.worksheet(name)
             except:
@@ -136,34 +217,995 @@ def init_google_sheets():
         st.error(f"❌ Google Sheets 연결 실패: {e}")
         st.stop()
 
-diary_worksheet, expert_worksheet, metaphor_worksheet = init_google_sheets()
+
+# 워크시트 행 번호 색인 (키 → 행 번호)
+SHEET_INDEX_TTL = float(get_config("SHEET_INDEX_TTL", 300))  # 외부 수정 대비 재구축 주기(초)
+
+class SheetRowIndex:
+    """
+    워크시트의 키 열(date 또는 date+expert_type) → 행 번호 색인
+    키 열만 한 번 읽어 구축하고, append/delete 시 증분 갱신
+    """
+    def __init__(self, worksheet, key_cols=1):
+        self.worksheet = worksheet
+        self.key_cols = key_cols
+        self.lock = threading.RLock()
+        self._rows = None
+        self._next_row = 2
+        self._built_at = 0.0
+    
+    def _key(self, values):
+        return tuple(str(v) for v in values[:self.key_cols])
+    
+    def _ensure(self):
+        if self._rows is not None and time.time() - self._built_at < SHEET_INDEX_TTL:
+            return
+        last_col = chr(64 + self.key_cols)
+        values = self.worksheet.get(f'A:{last_col}')
+        rows = {}
+        for idx, row in enumerate(values[1:], start=2):
+            if len(row) >= self.key_cols and row[0]:
+                rows.setdefault(self._key(row), idx)
+        self._rows = rows
+        self._next_row = len(values) + 1
+        self._built_at = time.time()
+    
+    def find(self, *key):
+        """키에 해당하는 행 번호 (없으면 None)"""
+        with self.lock:
+            self._ensure()
+            return self._rows.get(self._key(key))
+    
+    def record_append(self, key, response=None):
+        """append_row 결과를 색인에 반영 (응답의 updatedRange에서 행 번호 추출)"""
+        self.record_append_many([key], response)
+    
+    def record_append_many(self, keys, response=None):
+        """append_rows 결과를 색인에 반영 (연속된 행에 순서대로 추가됨)"""
+        with self.lock:
+            if self._rows is None:
+                return
+            try:
+                updated_range = response['updates']['updatedRange']
+                start = int(re.search(r'[A-Z]+(\d+)', updated_range.split('!')[-1]).group(1))
+            except Exception:
+                start = self._next_row
+            for offset, key in enumerate(keys):
+                self._rows[self._key(key)] = start + offset
+            self._next_row = max(self._next_row, start + len(keys))
+    
+    def record_delete(self, row):
+        """delete_rows 후 아래 행들의 번호를 한 칸씩 당김"""
+        with self.lock:
+            if self._rows is None:
+                return
+            self._rows = {
+                k: (r - 1 if r > row else r)
+                for k, r in self._rows.items() if r != row
+            }
+            self._next_row = max(2, self._next_row - 1)
+    
+    def verify(self, row, *key):
+        """행의 키 셀만 읽어 색인이 맞는지 확인 (덮어쓰기/삭제 전, TTL 안의 외부 수정 대비)"""
+        last_col = chr(64 + self.key_cols)
+        values = self.worksheet.get(f'A{row}:{last_col}{row}')
+        return bool(values) and self._key(values[0]) == self._key(key)
+    
+    def verify_many(self, rows_and_keys):
+        """[(행 번호, 키)]의 키 셀을 batch_get 한 번으로 확인 → 일치 여부 목록"""
+        if not rows_and_keys:
+            return []
+        last_col = chr(64 + self.key_cols)
+        results = self.worksheet.batch_get([f'A{row}:{last_col}{row}' for row, _ in rows_and_keys])
+        return [
+            bool(values) and self._key(values[0]) == self._key(key)
+            for values, (_, key) in zip(results, rows_and_keys)
+        ]
+    
+    def invalidate(self):
+        with self.lock:
+            self._rows = None
+
+def parse_diary_record(record):
+    """저장소 레코드 → 앱에서 쓰는 일기 dict"""
+    date_str = record['date']
+    keywords_str = record.get('keywords', '[]')
+    try:
+        keywords = json.loads(keywords_str) if isinstance(keywords_str, str) else keywords_str
+    except:
+        keywords = keywords_str.split(',') if keywords_str else []
+    
+    return {
+        'date': date_str, 'content': record.get('content', ''),
+        'keywords': keywords, 'total_score': float(record.get('total_score', 0)),
+        'joy': int(record.get('joy', 0)), 'sadness': int(record.get('sadness', 0)),
+        'anger': int(record.get('anger', 0)), 'anxiety': int(record.get('anxiety', 0)),
+        'calmness': int(record.get('calmness', 0)), 'message': record.get('message', '')
+    }
+
+def diary_row(date_str, item_data, created_at=None):
+    """일기 dict → diary_data 행 (SHEET_HEADERS 순서)"""
+    keywords_str = json.dumps(item_data['keywords'], ensure_ascii=False)
+    return [
+        str(date_str), str(item_data['content']), str(keywords_str), float(item_data['total_score']),
+        int(item_data['joy']), int(item_data['sadness']), int(item_data['anger']),
+        int(item_data['anxiety']), int(item_data['calmness']), str(item_data['message']),
+        created_at or datetime.now().isoformat()
+    ]
+
+def advice_row(date_str, expert_type, advice, has_content):
+    """조언 → expert_advice 행 (SHEET_HEADERS 순서)"""
+    return [str(date_str), str(expert_type), str(advice), str(has_content), datetime.now().isoformat()]
+
+def parse_advice_record(record):
+    return {
+        'advice': record.get('advice', ''),
+        'has_content': record.get('has_content', 'False') == 'True',
+        'created_at': record.get('created_at', '')
+    }
+
+class DiaryStorage(ABC):
+    """
+    저장소 인터페이스 (추상 메서드를 모두 구현해야 생성 가능)
+    실패 시 예외를 그대로 올리고, 사용자 메시지는 호출하는 데이터 함수에서 처리
+    """
+    @abstractmethod
+    def load_all(self):
+        """{date: 일기 dict}"""
+    
+    @abstractmethod
+    def upsert_diary(self, date_str, item_data):
+        """날짜의 일기 저장 (있으면 덮어씀)"""
+    
+    @abstractmethod
+    def delete_diary(self, date_str):
+        """삭제했으면 True, 해당 날짜가 없으면 False"""
+    
+    def has_diary(self, date_str):
+        """해당 날짜의 일기가 있는지 (기본 구현: 전체 조회)"""
+        return date_str in self.load_all()
+    
+    def upsert_diary_many(self, entries):
+        """여러 일기를 한 번에 저장 - entries: [(date_str, item_data)]"""
+        self.apply_writes([
+            {'sheet': "diary_data", 'op': 'upsert', 'key': [date_str], 'row': diary_row(date_str, item_data)}
+            for date_str, item_data in entries
+        ])
+    
+    @abstractmethod
+    def upsert_advice(self, date_str, expert_type, advice, has_content):
+        """날짜·전문가별 조언 저장 (있으면 덮어씀)"""
+    
+    def upsert_advice_many(self, date_str, advice_by_expert):
+        """
+        한 날짜의 여러 전문가 조언을 한 번에 저장
+        advice_by_expert: {expert_type: {'advice', 'has_content'}}
+        """
+        self.apply_writes([
+            {'sheet': "expert_advice", 'op': 'upsert', 'key': [date_str, expert_type],
+             'row': advice_row(date_str, expert_type, result['advice'], result['has_content'])}
+            for expert_type, result in advice_by_expert.items()
+        ])
+    
+    @abstractmethod
+    def load_advice_for_date(self, date_str):
+        """{expert_type: {'advice', 'has_content', 'created_at'}}"""
+    
+    def load_advice_for_dates(self, dates):
+        """
+        {date: {expert_type: 조언}} - 여러 날짜를 한 번에 조회
+        전체를 읽는 저장소는 요청하지 않은 날짜까지 돌려줄 수 있음
+        """
+        return {date_str: self.load_advice_for_date(date_str) for date_str in dates}
+    
+    @abstractmethod
+    def upsert_metaphor(self, date_str, image_url, prompt):
+        """날짜의 은유 이미지 저장 (있으면 덮어씀)"""
+    
+    @abstractmethod
+    def load_metaphor(self, date_str):
+        """(image_url, prompt), 없으면 (None, None)"""
+    
+    def apply_writes(self, ops):
+        """
+        쓰기 저널의 작업 목록 반영 (기본 구현: 한 건씩 처리)
+        op: {'sheet': 워크시트 이름, 'op': 'upsert'|'delete', 'key': [...], 'row': SHEET_HEADERS 순서의 행}
+        """
+        for op in ops:
+            if op['op'] == 'delete':
+                if op['sheet'] == "diary_data":
+                    self.delete_diary(op['key'][0])
+                continue
+            record = dict(zip(SHEET_HEADERS[op['sheet']], op['row']))
+            if op['sheet'] == "diary_data":
+                self.upsert_diary(record['date'], parse_diary_record(record))
+            elif op['sheet'] == "expert_advice":
+                self.upsert_advice(record['date'], record['expert_type'], record['advice'], record['has_content'])
+            elif op['sheet'] == "metaphor_images":
+                self.upsert_metaphor(record['date'], record['image_url'], record['prompt'])
+
+class SheetsStorage(DiaryStorage):
+    """Google Sheets 저장소 (gspread)"""
+    def __init__(self, diary_ws, expert_ws, metaphor_ws):
+        self.diary_ws = diary_ws
+        self.expert_ws = expert_ws
+        self.metaphor_ws = metaphor_ws
+        self.indexes = {
+            "diary_data": SheetRowIndex(diary_ws, key_cols=1),
+            "expert_advice": SheetRowIndex(expert_ws, key_cols=2),
+            "metaphor_images": SheetRowIndex(metaphor_ws, key_cols=1)
+        }
+    
+    def _upsert_row(self, name, worksheet, key, row_data):
+        last_col = chr(64 + len(SHEET_HEADERS[name]))
+        index = self.indexes[name]
+        with index.lock:
+            row_index = index.find(*key)
+            if row_index and not index.verify(row_index, *key):
+                # 시트에서 행이 지워져 번호가 밀림 → 다른 날짜를 덮어쓰지 않도록 색인 재구축
+                index.invalidate()
+                row_index = index.find(*key)
+            if row_index:
+                worksheet.update(f'A{row_index}:{last_col}{row_index}', [row_data])
+            else:
+                response = worksheet.append_row(row_data)
+                index.record_append(key, response)
+    
+    def load_all(self):
+        records = self.diary_ws.get_all_records()
+        return {record['date']: parse_diary_record(record) for record in records if record.get('date')}
+    
+    def upsert_diary(self, date_str, item_data):
+        self._upsert_row("diary_data", self.diary_ws, (date_str,), diary_row(date_str, item_data))
+    
+    def delete_diary(self, date_str):
+        index = self.indexes["diary_data"]
+        with index.lock:
+            row_index = index.find(date_str)
+            if row_index and not index.verify(row_index, date_str):
+                # 시트가 외부에서 수정됨 → 색인 재구축 후 다시 조회
+                index.invalidate()
+                row_index = index.find(date_str)
+            if not row_index:
+                return False
+            self.diary_ws.delete_rows(row_index)
+            index.record_delete(row_index)
+        return True
+    
+    def has_diary(self, date_str):
+        index = self.indexes["diary_data"]
+        with index.lock:
+            row_index = index.find(date_str)
+            if row_index and not index.verify(row_index, date_str):
+                index.invalidate()
+                row_index = index.find(date_str)
+            return bool(row_index)
+    
+    def upsert_advice(self, date_str, expert_type, advice, has_content):
+        row_data = advice_row(date_str, expert_type, advice, has_content)
+        self._upsert_row("expert_advice", self.expert_ws, (date_str, expert_type), row_data)
+    
+    def load_advice_for_date(self, date_str):
+        records = self.expert_ws.get_all_records()
+        return {
+            record.get('expert_type', ''): parse_advice_record(record)
+            for record in records if record.get('date') == date_str
+        }
+    
+    def load_advice_for_dates(self, dates):
+        # 시트는 어차피 전체를 내려받으므로 모든 날짜를 돌려줌
+        advice_by_date = {date_str: {} for date_str in dates}
+        for record in self.expert_ws.get_all_records():
+            if record.get('date'):
+                advice_by_date.setdefault(record['date'], {})[record.get('expert_type', '')] = parse_advice_record(record)
+        return advice_by_date
+    
+    def upsert_metaphor(self, date_str, image_url, prompt):
+        row_data = [date_str, image_url, prompt, datetime.now().isoformat()]
+        self._upsert_row("metaphor_images", self.metaphor_ws, (date_str,), row_data)
+    
+    def load_metaphor(self, date_str):
+        # 색인으로 해당 날짜의 행 하나만 읽음
+        index = self.indexes["metaphor_images"]
+        row_index = index.find(date_str)
+        if not row_index:
+            return None, None
+        row = self.metaphor_ws.row_values(row_index)
+        if not row or row[0] != date_str:
+            index.invalidate()
+            row_index = index.find(date_str)
+            row = self.metaphor_ws.row_values(row_index) if row_index else []
+        row = row + [''] * (len(SHEET_HEADERS["metaphor_images"]) - len(row))
+        return (row[1], row[2]) if row[0] == date_str else (None, None)
+    
+    def _verified_rows(self, index, keys):
+        """
+        키 목록 → 행 번호 목록 (없으면 None)
+        찾은 행의 키 셀을 batch_get 한 번으로 확인하고, 하나라도 어긋나면 색인 재구축 후 다시 조회
+        """
+        rows = [index.find(*key) for key in keys]
+        found = [(row, key) for row, key in zip(rows, keys) if row]
+        if found and not all(index.verify_many(found)):
+            index.invalidate()
+            rows = [index.find(*key) for key in keys]
+        return rows
+    
+    def apply_writes(self, ops):
+        """워크시트별로 묶어 삭제 → batch_update → append_rows 순으로 반영"""
+        worksheets = {
+            "diary_data": self.diary_ws,
+            "expert_advice": self.expert_ws,
+            "metaphor_images": self.metaphor_ws
+        }
+        for name, worksheet in worksheets.items():
+            sheet_ops = [op for op in ops if op['sheet'] == name]
+            if not sheet_ops:
+                continue
+            last_col = chr(64 + len(SHEET_HEADERS[name]))
+            index = self.indexes[name]
+            with index.lock:
+                # 아래쪽 행부터 삭제해야 위쪽 행 번호가 밀리지 않음
+                delete_keys = [op['key'] for op in sheet_ops if op['op'] == 'delete']
+                delete_rows = {row for row in self._verified_rows(index, delete_keys) if row}
+                for row_index in sorted(delete_rows, reverse=True):
+                    worksheet.delete_rows(row_index)
+                    index.record_delete(row_index)
+                
+                upsert_ops = [op for op in sheet_ops if op['op'] == 'upsert']
+                upsert_rows = self._verified_rows(index, [op['key'] for op in upsert_ops])
+                updates, append_keys, append_values = [], [], []
+                for op, row_index in zip(upsert_ops, upsert_rows):
+                    if row_index:
+                        updates.append({'range': f'A{row_index}:{last_col}{row_index}', 'values': [op['row']]})
+                    else:
+                        append_keys.append(tuple(op['key']))
+                        append_values.append(op['row'])
+                
+                if updates:
+                    worksheet.batch_update(updates)
+                if append_values:
+                    response = worksheet.append_rows(append_values)
+                    index.record_append_many(append_keys, response)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diary_data (
+    date TEXT NOT NULL, content TEXT, keywords TEXT, total_score REAL,
+    joy INTEGER, sadness INTEGER, anger INTEGER, anxiety INTEGER, calmness INTEGER,
+    message TEXT, created_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_diary_date ON diary_data (date);
+
+CREATE TABLE IF NOT EXISTS expert_advice (
+    date TEXT NOT NULL, expert_type TEXT NOT NULL, advice TEXT, has_content TEXT, created_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_expert_date_type ON expert_advice (date, expert_type);
+
+CREATE TABLE IF NOT EXISTS metaphor_images (
+    date TEXT NOT NULL, image_url TEXT, prompt TEXT, created_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_metaphor_date ON metaphor_images (date);
+"""
+
+class SQLiteStorage(DiaryStorage):
+    """로컬 SQLite 저장소 (오프라인 실행 및 부하 테스트용)"""
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SQLITE_SCHEMA)
+    
+    def _execute(self, sql, params=()):
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params)
+    
+    def _query(self, sql, params=()):
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+    
+    def load_all(self):
+        rows = self._query("SELECT * FROM diary_data ORDER BY date")
+        return {row['date']: parse_diary_record(row) for row in rows}
+    
+    def upsert_diary(self, date_str, item_data):
+        self._execute(
+            f"INSERT OR REPLACE INTO diary_data ({', '.join(SHEET_HEADERS['diary_data'])}) "
+            f"VALUES ({', '.join('?' * len(SHEET_HEADERS['diary_data']))})",
+            diary_row(date_str, item_data)
+        )
+    
+    def delete_diary(self, date_str):
+        return self._execute("DELETE FROM diary_data WHERE date = ?", (date_str,)).rowcount > 0
+    
+    def has_diary(self, date_str):
+        return bool(self._query("SELECT 1 FROM diary_data WHERE date = ?", (date_str,)))
+    
+    def upsert_diary_many(self, entries):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO diary_data ({', '.join(SHEET_HEADERS['diary_data'])}) "
+                f"VALUES ({', '.join('?' * len(SHEET_HEADERS['diary_data']))})",
+                [diary_row(date_str, item_data) for date_str, item_data in entries]
+            )
+    
+    def upsert_advice(self, date_str, expert_type, advice, has_content):
+        self._execute(
+            "INSERT OR REPLACE INTO expert_advice (date, expert_type, advice, has_content, created_at) VALUES (?, ?, ?, ?, ?)",
+            advice_row(date_str, expert_type, advice, has_content)
+        )
+    
+    def upsert_advice_many(self, date_str, advice_by_expert):
+        rows = [
+            advice_row(date_str, expert_type, result['advice'], result['has_content'])
+            for expert_type, result in advice_by_expert.items()
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO expert_advice (date, expert_type, advice, has_content, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+    
+    def load_advice_for_date(self, date_str):
+        rows = self._query("SELECT * FROM expert_advice WHERE date = ?", (date_str,))
+        return {row['expert_type']: parse_advice_record(row) for row in rows}
+    
+    def load_advice_for_dates(self, dates):
+        dates = list(dates)
+        advice_by_date = {date_str: {} for date_str in dates}
+        for start in range(0, len(dates), 500):  # SQLite 변수 개수 제한
+            chunk = dates[start:start + 500]
+            rows = self._query(f"SELECT * FROM expert_advice WHERE date IN ({', '.join('?' * len(chunk))})", chunk)
+            for row in rows:
+                advice_by_date[row['date']][row['expert_type']] = parse_advice_record(row)
+        return advice_by_date
+    
+    def upsert_metaphor(self, date_str, image_url, prompt):
+        self._execute(
+            "INSERT OR REPLACE INTO metaphor_images (date, image_url, prompt, created_at) VALUES (?, ?, ?, ?)",
+            (date_str, image_url, prompt, datetime.now().isoformat())
+        )
+    
+    def load_metaphor(self, date_str):
+        rows = self._query("SELECT image_url, prompt FROM metaphor_images WHERE date = ?", (date_str,))
+        if rows:
+            return rows[0]['image_url'], rows[0]['prompt']
+        return None, None
+
+# 쓰기 지연(write-behind) 설정
+WRITE_BEHIND_ENABLED = get_config_flag("WRITE_BEHIND", STORAGE_BACKEND == "sheets")
+WRITE_BEHIND_JOURNAL = get_config("WRITE_BEHIND_JOURNAL", os.path.join(LOCAL_DATA_DIR, "write_journal.jsonl"))
+WRITE_BEHIND_INTERVAL = float(get_config("WRITE_BEHIND_INTERVAL", 2))  # 플러시 주기(초)
+WRITE_BEHIND_MAX_BACKOFF = float(get_config("WRITE_BEHIND_MAX_BACKOFF", 60))
+WRITE_BEHIND_FLUSH_CHUNK = int(get_config("WRITE_BEHIND_FLUSH_CHUNK", 200))  # 한 번에 반영하는 작업 수 (Sheets 요청 크기/할당량 제한)
+
+class WriteBehindStorage(DiaryStorage):
+    """
+    쓰기는 로컬 append-only 저널에 기록하고 즉시 반환,
+    백그라운드 플러셔가 워크시트별로 모아 실제 저장소에 반영
+    재시작 시 저널에 남은 작업을 다시 반영하고, 읽기에는 대기 중인 쓰기를 덧씌움
+    """
+    def __init__(self, inner, journal_path):
+        self.inner = inner
+        self.journal_path = journal_path
+        self.lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._seq = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self.stats = {'flushed': 0, 'flushes': 0, 'failures': 0, 'last_error': None, 'last_flush_at': None}
+        if os.path.dirname(journal_path):
+            os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        self._replay()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+        self._thread.start()
+    
+    # 저널
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue  # 기록 도중 중단된 마지막 줄
+                self._pending.append(op)
+                self._seq = max(self._seq, op['seq'])
+    
+    def _append(self, sheet, op_type, key, row=None):
+        self._append_many([(sheet, op_type, key, row)])
+    
+    def _append_many(self, entries):
+        """여러 작업을 저널에 한 번에 기록 (fsync 1회)"""
+        with self.lock:
+            ops = []
+            for sheet, op_type, key, row in entries:
+                self._seq += 1
+                ops.append({'seq': self._seq, 'sheet': sheet, 'op': op_type, 'key': list(key), 'row': row})
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.extend(ops)
+        self._wake.set()
+    
+    def _compact(self):
+        """반영된 작업을 지우고 대기 중인 작업만 남겨 저널을 다시 씀"""
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for op in self._pending:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+    
+    def _pending_for(self, sheet):
+        with self.lock:
+            return [op for op in self._pending if op['sheet'] == sheet]
+    
+    # 플러셔
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=WRITE_BEHIND_INTERVAL)
+            self._wake.clear()
+            try:
+                if self._pending and time.time() >= self._retry_at:
+                    self.flush()
+            except Exception as e:
+                # 저널 압축 실패(디스크 부족, 권한 등)에도 플러셔는 멈추지 않고 물러났다가 재시도
+                self._record_failure(e)
+    
+    def _record_failure(self, error):
+        self._failures += 1
+        delay = min(WRITE_BEHIND_MAX_BACKOFF, WRITE_BEHIND_INTERVAL * 2 ** self._failures)
+        self._retry_at = time.time() + delay * (0.5 + random.random() / 2)
+        self.stats['failures'] += 1
+        self.stats['last_error'] = str(error)
+    
+    def flush(self):
+        """대기 중인 작업을 WRITE_BEHIND_FLUSH_CHUNK개씩 키별 마지막 작업으로 합쳐 반영"""
+        with self._flush_lock:
+            while True:
+                flushed = self._flush_chunk()
+                if flushed is None:
+                    return True
+                if not flushed:
+                    return False
+    
+    def _flush_chunk(self):
+        """가장 오래된 작업 묶음 하나 반영 → 성공 여부 (대기 작업이 없으면 None)"""
+        with self.lock:
+            if not self._pending:
+                return None
+            taken = self._pending[:WRITE_BEHIND_FLUSH_CHUNK]
+        max_seq = taken[-1]['seq']
+        latest = {}
+        for op in taken:
+            latest[(op['sheet'], tuple(op['key']))] = op
+        
+        try:
+            self.inner.apply_writes(list(latest.values()))
+        except Exception as e:
+            self._record_failure(e)
+            return False
+        
+        with self.lock:
+            self._pending = [op for op in self._pending if op['seq'] > max_seq]
+            self._compact()
+        self._failures = 0
+        self._retry_at = 0.0
+        self.stats['flushed'] += len(taken)
+        self.stats['flushes'] += 1
+        self.stats['last_error'] = None
+        self.stats['last_flush_at'] = datetime.now().isoformat(timespec='seconds')
+        return True
+    
+    def pending_count(self):
+        with self.lock:
+            return len(self._pending)
+    
+    # 쓰기: 저널에 기록 후 즉시 반환
+    def upsert_diary(self, date_str, item_data):
+        self._append("diary_data", 'upsert', (date_str,), diary_row(date_str, item_data))
+    
+    def delete_diary(self, date_str):
+        if not self.has_diary(date_str):
+            return False
+        self._append("diary_data", 'delete', (date_str,))
+        return True
+    
+    def has_diary(self, date_str):
+        # 대기 중인 마지막 작업이 있으면 그 결과, 없으면 실제 저장소 확인
+        pending = [op for op in self._pending_for("diary_data") if op['key'][0] == date_str]
+        if pending:
+            return pending[-1]['op'] == 'upsert'
+        return self.inner.has_diary(date_str)
+    
+    def upsert_diary_many(self, entries):
+        self._append_many([
+            ("diary_data", 'upsert', (date_str,), diary_row(date_str, item_data))
+            for date_str, item_data in entries
+        ])
+    
+    def upsert_advice(self, date_str, expert_type, advice, has_content):
+        row_data = advice_row(date_str, expert_type, advice, has_content)
+        self._append("expert_advice", 'upsert', (date_str, expert_type), row_data)
+    
+    def upsert_advice_many(self, date_str, advice_by_expert):
+        self._append_many([
+            ("expert_advice", 'upsert', (date_str, expert_type),
+             advice_row(date_str, expert_type, result['advice'], result['has_content']))
+            for expert_type, result in advice_by_expert.items()
+        ])
+    
+    def upsert_metaphor(self, date_str, image_url, prompt):
+        self._append("metaphor_images", 'upsert', (date_str,), [date_str, image_url, prompt, datetime.now().isoformat()])
+    
+    # 읽기: 실제 저장소 결과 위에 대기 중인 쓰기를 순서대로 덧씌움
+    # 대기 작업을 먼저 잡아둬야 읽는 도중 플러시된 작업도 빠지지 않음 (다시 덧씌워도 결과는 같음)
+    def load_all(self):
+        pending = self._pending_for("diary_data")
+        data = self.inner.load_all()
+        for op in pending:
+            if op['op'] == 'delete':
+                data.pop(op['key'][0], None)
+            else:
+                data[op['key'][0]] = parse_diary_record(dict(zip(SHEET_HEADERS["diary_data"], op['row'])))
+        return data
+    
+    def load_advice_for_date(self, date_str):
+        return self.load_advice_for_dates([date_str])[date_str]
+    
+    def load_advice_for_dates(self, dates):
+        pending = self._pending_for("expert_advice")
+        advice_by_date = self.inner.load_advice_for_dates(dates)
+        for op in pending:
+            if op['key'][0] in advice_by_date:
+                advice_by_date[op['key'][0]][op['key'][1]] = parse_advice_record(dict(zip(SHEET_HEADERS["expert_advice"], op['row'])))
+        return advice_by_date
+    
+    def load_metaphor(self, date_str):
+        pending = [op for op in self._pending_for("metaphor_images") if op['key'][0] == date_str]
+        if pending:
+            return pending[-1]['row'][1], pending[-1]['row'][2]
+        return self.inner.load_metaphor(date_str)
+    
+    def apply_writes(self, ops):
+        self.inner.apply_writes(ops)
+
+@st.cache_resource
+def init_storage(backend):
+    """설정된 저장소 생성 (프로세스 전역 공유)"""
+    if backend == "sqlite":
+        try:
+            inner = SQLiteStorage(SQLITE_PATH)
+        except Exception as e:
+            st.error(f"❌ SQLite 저장소 초기화 실패: {e}")
+            st.stop()
+    else:
+        inner = SheetsStorage(*init_google_sheets())
+    
+    if WRITE_BEHIND_ENABLED:
+        return WriteBehindStorage(inner, WRITE_BEHIND_JOURNAL)
+    return inner
+
+storage = timed_startup("저장소", init_storage, STORAGE_BACKEND)
+
+# 외부 API HTTP 클라이언트 (프로세스 전역 keep-alive 연결 풀)
+HTTP_POOL_SIZE = int(get_config("HTTP_POOL_SIZE", 10))  # 호스트당 연결 수
+HTTP_MAX_RETRIES = int(get_config("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_BASE = float(get_config("HTTP_BACKOFF_BASE", 0.5))  # 재시도 대기 기준(초)
+HTTP_RETRY_STATUSES = (429, 503)
+
+class HttpClient:
+    """
+    모든 외부 호출이 공유하는 requests.Session
+    호스트별 연결 풀 재사용, 429/503은 지터를 섞은 지수 백오프로 재시도, 엔드포인트별 지연 시간 기록
+    """
+    def __init__(self, pool_size):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.lock = threading.Lock()
+        self.metrics = {}
+    
+    def _record(self, endpoint, elapsed_ms, error=False, retried=False):
+        with self.lock:
+            m = self.metrics.setdefault(endpoint, {
+                'count': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'recent': deque(maxlen=200)
+            })
+            m['count'] += 1
+            m['errors'] += int(error)
+            m['retries'] += int(retried)
+            m['total_ms'] += elapsed_ms
+            m['max_ms'] = max(m['max_ms'], elapsed_ms)
+            m['recent'].append(elapsed_ms)
+    
+    def request(self, endpoint, method, url, retries=None, **kwargs):
+        retries = HTTP_MAX_RETRIES if retries is None else retries
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self._record(endpoint, (time.perf_counter() - started) * 1000, error=True)
+                raise
+            
+            will_retry = response.status_code in HTTP_RETRY_STATUSES and attempt < retries
+            self._record(endpoint, (time.perf_counter() - started) * 1000,
+                         error=response.status_code >= 400, retried=will_retry)
+            if not will_retry:
+                return response
+            
+            try:
+                delay = min(float(response.headers.get('Retry-After', '')), 30.0)
+            except ValueError:
+                delay = HTTP_BACKOFF_BASE * 2 ** attempt
+            time.sleep(delay * (0.5 + random.random()))
+        return response
+    
+    def get(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "GET", url, **kwargs)
+    
+    def post(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "POST", url, **kwargs)
+    
+    def metrics_summary(self):
+        """엔드포인트별 호출 수, 평균/p95/최대 지연(ms), 오류/재시도 수"""
+        with self.lock:
+            summary = {}
+            for endpoint, m in self.metrics.items():
+                recent = sorted(m['recent'])
+                summary[endpoint] = {
+                    'count': m['count'], 'errors': m['errors'], 'retries': m['retries'],
+                    'avg_ms': m['total_ms'] / m['count'],
+                    'p95_ms': recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+                    'max_ms': m['max_ms']
+                }
+            return summary
+
+@st.cache_resource
+def get_http_client():
+    return HttpClient(HTTP_POOL_SIZE)
+
+http_client = get_http_client()
 
 # 네이버 클로버 음성인식
-def clova_speech_to_text(audio_file):
+CLOVA_STT_URL = "https://naveropenapi.apigw.ntruss.com/recog/v1/stt?lang=Kor"
+STT_CHUNK_SECONDS = float(get_config("STT_CHUNK_SECONDS", 50))  # CSR 한 요청 최대 60초
+STT_MIN_CHUNK_SECONDS = float(get_config("STT_MIN_CHUNK_SECONDS", 20))  # 무음을 찾는 구간 시작
+STT_MAX_IN_FLIGHT = int(get_config("STT_MAX_IN_FLIGHT", 4))  # 동시에 보내는 조각 수
+STT_FRAME_MS = 30  # 무음 판정 단위
+
+def _clova_stt_request(audio_data):
+    """조각 하나 변환 → (텍스트, 오류). 작업 스레드에서 호출되므로 st 사용 금지"""
     try:
-        url = "https://naveropenapi.apigw.ntruss.com/recog/v1/stt?lang=Kor"
         headers = {
             "X-NCP-APIGW-API-KEY-ID": NAVER_CLIENT_ID,
             "X-NCP-APIGW-API-KEY": NAVER_CLIENT_SECRET,
             "Content-Type": "application/octet-stream"
         }
-        audio_data = audio_file.getvalue()
-        response = requests.post(url, headers=headers, data=audio_data)
+        response = http_client.post("clova_stt", CLOVA_STT_URL, headers=headers, data=audio_data)
         
         if response.status_code == 200:
-            result = response.json()
-            return result.get('text', "❌ 텍스트를 찾을 수 없습니다.")
+            text = response.json().get('text')
+            if text is None:
+                return None, "❌ 텍스트를 찾을 수 없습니다."
+            return text, None
         else:
             error_msg = response.json().get('errorMessage', '알 수 없는 오류')
-            return f"❌ API 오류 ({response.status_code}): {error_msg}"
+            return None, f"❌ API 오류 ({response.status_code}): {error_msg}"
     except Exception as e:
-        return f"❌ 오류: {str(e)}"
+        return None, f"❌ 오류: {str(e)}"
+
+_WAV_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+def find_wav_cut_points(wav_file, max_seconds=STT_CHUNK_SECONDS, min_seconds=STT_MIN_CHUNK_SECONDS):
+    """
+    WAV를 max_seconds 이하 조각으로 나눌 위치(프레임 번호) 계산
+    각 조각 끝은 [min_seconds, max_seconds] 구간에서 가장 조용한 지점 (말 중간에서 끊기지 않도록)
+    파일은 몇 초 단위로 읽어 프레임별 RMS만 남김
+    """
+    with wave.open(wav_file, 'rb') as wf:
+        rate, channels, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+        total = wf.getnframes()
+        if width not in _WAV_DTYPES:
+            raise ValueError(f"지원하지 않는 샘플 크기: {width}")
+        window = max(1, rate * STT_FRAME_MS // 1000)
+        block = window * max(1, 5000 // STT_FRAME_MS)  # 약 5초씩 읽기
+        rms = []
+        while True:
+            raw = wf.readframes(block)
+            if not raw:
+                break
+            samples = np.frombuffer(raw, dtype=_WAV_DTYPES[width]).astype(np.float64)
+            if width == 1:
+                samples -= 128
+            usable = len(samples) // (window * channels) * window * channels
+            if usable:
+                frames = samples[:usable].reshape(-1, window * channels)
+                rms.append(np.sqrt(np.mean(frames ** 2, axis=1)))
+    rms = np.concatenate(rms) if rms else np.zeros(0)
+    
+    max_frames = int(max_seconds * 1000 // STT_FRAME_MS)
+    min_frames = int(min(min_seconds, max_seconds) * 1000 // STT_FRAME_MS)
+    cuts, start = [0], 0
+    while len(rms) - start > max_frames:
+        segment = rms[start + min_frames:start + max_frames]
+        start = start + min_frames + int(np.argmin(segment))
+        cuts.append(start * window)
+    cuts.append(total)
+    return cuts, (rate, channels, width)
+
+def iter_wav_chunks(wav_file, cuts, params):
+    """cut 위치대로 조각을 하나씩 WAV bytes로 인코딩 (필요할 때만 읽음)"""
+    rate, channels, width = params
+    wav_file.seek(0)
+    with wave.open(wav_file, 'rb') as wf:
+        for begin, end in zip(cuts, cuts[1:]):
+            wf.setpos(begin)
+            out = BytesIO()
+            with wave.open(out, 'wb') as chunk:
+                chunk.setnchannels(channels)
+                chunk.setsampwidth(width)
+                chunk.setframerate(rate)
+                chunk.writeframes(wf.readframes(end - begin))
+            yield out.getvalue()
+
+def clova_speech_to_text(audio_file, on_partial=None):
+    """
+    긴 녹음은 무음 지점에서 조각내 동시에 변환하고 순서대로 이어붙임
+    on_partial(text, done, total): 조각이 끝날 때마다 (스크립트 스레드에서) 호출
+    WAV가 아니면 한 번에 전송
+    반환: (텍스트, 오류 목록) - 모두 실패하면 텍스트는 None, 일부 실패면 빠진 구간은 "[…]"
+    """
+    try:
+        audio_file.seek(0)
+        cuts, params = find_wav_cut_points(audio_file)
+    except Exception:
+        text, error = _clova_stt_request(audio_file.getvalue())
+        return text, [error] if error else []
+    
+    total = len(cuts) - 1
+    if total <= 1:
+        audio_file.seek(0)
+        text, error = _clova_stt_request(audio_file.getvalue())
+        return text, [error] if error else []
+    
+    chunks = iter_wav_chunks(audio_file, cuts, params)
+    results = [None] * total
+    errors = {}
+    pending = {}
+    next_index = 0
+    
+    while next_index < total or pending:
+        # 동시에 보내는 조각 수를 제한해 메모리에 올라가는 오디오도 제한
+        while next_index < total and len(pending) < STT_MAX_IN_FLIGHT:
+            pending[http_executor.submit(_clova_stt_request, next(chunks))] = next_index
+            next_index += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            text, error = future.result()
+            if error:
+                errors[index] = error
+                results[index] = "[…]"
+            else:
+                results[index] = text
+        if on_partial:
+            partial = " ".join(r if r is not None else "…" for r in results)
+            on_partial(partial, next_index - len(pending), total)
+    
+    messages = [f"{index + 1}/{total} 구간: {errors[index]}" for index in sorted(errors)]
+    if len(errors) == total:
+        return None, messages
+    return " ".join(r for r in results if r), messages
+
+# 생성 이미지 캐시 (같은 프롬프트면 원격 생성 없이 바로 반환)
+IMAGE_CACHE_ENABLED = get_config_flag("IMAGE_CACHE", True)
+IMAGE_CACHE_DIR = get_config("IMAGE_CACHE_DIR", os.path.join(LOCAL_DATA_DIR, "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(get_config("IMAGE_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+IMAGE_CACHE_PREWARM = get_config_flag("IMAGE_CACHE_PREWARM", False)  # 시작 시 감정별 기본 이미지 미리 생성
+
+class ImageCache:
+    """
+    (provider, 프롬프트, negative 프롬프트, 크기) → PNG bytes 디스크 캐시
+    전체 용량이 예산을 넘으면 가장 오래 쓰지 않은 파일부터 삭제 (LRU)
+    """
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(root, exist_ok=True)
+        # 마지막 사용 시각(mtime) 순으로 기존 파일 복원
+        entries = []
+        for name in os.listdir(root):
+            if name.endswith(".png"):
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total = sum(self._entries.values())
+    
+    @staticmethod
+    def make_key(provider, prompt, negative_prompt="", width=512, height=512):
+        raw = json.dumps([provider, prompt, negative_prompt, width, height], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.root, key + ".png")
+    
+    def get(self, key):
+        with self.lock:
+            if key not in self._entries:
+                self.stats['misses'] += 1
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                self._total -= self._entries.pop(key)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return data
+    
+    def put(self, key, data):
+        with self.lock:
+            tmp_path = f"{self._path(key)}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+                self._total -= size
+                self.stats['evictions'] += 1
+    
+    def __contains__(self, key):
+        return key in self._entries
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @property
+    def total_bytes(self):
+        return self._total
+
+@st.cache_resource
+def get_image_cache():
+    try:
+        return ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+    except Exception:
+        return None
+
+image_cache = get_image_cache() if IMAGE_CACHE_ENABLED else None
 
 # Pollinations.ai 이미지 생성 (완전 무료, API 키 불필요)
-def generate_image_with_pollinations(prompt):
+def generate_image_with_pollinations(prompt, use_cache=True):
     """
     Pollinations.ai로 이미지 생성 (완전 무료, 빠름)
+    use_cache=False: 캐시를 읽지 않고 새 시드로 생성 (결과는 캐시에 덮어씀, 재생성용)
     """
+    cache_key = ImageCache.make_key("pollinations", prompt)
+    if use_cache and image_cache is not None:
+        cached = image_cache.get(cache_key)
+        if cached is not None:
+            return base64.b64encode(cached).decode(), None
+    
     try:
         # URL 인코딩
         import urllib.parse
@@ -171,8 +1213,11 @@ def generate_image_with_pollinations(prompt):
         
         # Pollinations.ai API 호출
         image_url = f"{POLLINATIONS_API_URL}{encoded_prompt}?width=512&height=512&nologo=true&enhance=true"
+        if not use_cache:
+            # 같은 프롬프트는 같은 이미지가 나오므로 시드를 바꿔 새 이미지 요청
+            image_url += f"&seed={random.randint(1, 2**31 - 1)}"
         
-        response = requests.get(image_url, timeout=30)
+        response = http_client.get("pollinations", image_url, timeout=30)
         
         if response.status_code == 200:
             # 이미지를 PIL로 열기
@@ -183,6 +1228,9 @@ def generate_image_with_pollinations(prompt):
             image.save(buffered, format="PNG")
             img_base64 = base64.b64encode(buffered.getvalue()).decode()
             
+            if image_cache is not None:
+                image_cache.put(cache_key, buffered.getvalue())
+            
             return img_base64, None
         else:
             return None, f"❌ Pollinations API 오류: HTTP {response.status_code}"
@@ -190,140 +1238,208 @@ def generate_image_with_pollinations(prompt):
     except Exception as e:
         return None, f"❌ Pollinations 오류: {str(e)}"
 
-# Hugging Face 이미지 생성 (디버깅 강화)
-def generate_image_with_huggingface(prompt, negative_prompt="", debug_mode=False):
+@st.cache_resource
+def get_http_executor():
+    """외부 HTTP 요청을 병렬로 보내는 스레드 풀 (프로세스 전역)"""
+    return ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="http")
+
+@st.cache_resource
+def get_model_cooldowns():
+    """최근 503/404를 돌려준 모델 → 다시 시도할 수 있는 시각"""
+    return {}
+
+http_executor = get_http_executor()
+model_cooldowns = get_model_cooldowns()
+
+def _request_huggingface_model(model_name, prompt, negative_prompt, use_cache=True):
     """
-    Hugging Face Stable Diffusion으로 이미지 생성 (자동 폴백)
+    모델 하나에 요청 (작업 스레드에서 실행 - st.* 호출 금지)
+    use_cache=False: Inference API의 같은 입력 응답 캐시도 건너뜀
+    반환: {'model', 'status', 'image', 'info': [디버그 문자열], 'estimated_time'}
     """
-    if not HUGGINGFACE_ENABLED:
-        return None, "Hugging Face API 키가 설정되지 않았습니다."
-    
-    debug_info = []
-    
-    # 여러 모델 시도
-    for model_idx, model_name in enumerate(HUGGINGFACE_MODELS):
-        api_url = f"https://api-inference.huggingface.co/models/{model_name}"
-        
-        if debug_mode:
-            debug_info.append(f"시도 중: {model_name}")
-        
-        headers = {
-            "Authorization": f"Bearer {HUGGINGFACE_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "negative_prompt": negative_prompt,
-                "num_inference_steps": 20,
-                "guidance_scale": 7.5,
-            }
+    result = {'model': model_name, 'status': 'error', 'image': None, 'info': [f"시도 중: {model_name}"], 'estimated_time': None}
+    info = result['info']
+    api_url = f"https://api-inference.huggingface.co/models/{model_name}"
+    headers = {
+        "Authorization": f"Bearer {HUGGINGFACE_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "inputs": prompt,
+        "parameters": {
+            "negative_prompt": negative_prompt,
+            "num_inference_steps": 20,
+            "guidance_scale": 7.5,
         }
+    }
+    if not use_cache:
+        payload["options"] = {"use_cache": False}
+    
+    try:
+        # 503(모델 로딩)은 기다리지 않고 바로 다음 모델로 넘어가도록 재시도하지 않음
+        response = http_client.post(
+            "huggingface",
+            api_url,
+            headers=headers,
+            json=payload,
+            timeout=60,
+            retries=0
+        )
+        info.append(f"  → 응답 코드: {response.status_code}")
+        info.append(f"  → Content-Type: {response.headers.get('content-type', 'N/A')}")
         
-        try:
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if debug_mode:
-                debug_info.append(f"  → 응답 코드: {response.status_code}")
-                debug_info.append(f"  → Content-Type: {response.headers.get('content-type', 'N/A')}")
-            
-            # 응답 상태 확인
-            if response.status_code == 200:
-                content_type = response.headers.get('content-type', '')
-                
-                # 이미지 데이터인 경우
-                if 'image' in content_type or len(response.content) > 1000:
-                    try:
-                        image = Image.open(BytesIO(response.content))
-                        buffered = BytesIO()
-                        image.save(buffered, format="PNG")
-                        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-                        
-                        if debug_mode:
-                            debug_info.append(f"  ✅ 성공!")
-                            return img_base64, "\n".join(debug_info)
-                        
-                        if model_idx > 0:
-                            st.info(f"✅ 대체 모델 사용: {model_name}")
-                        
-                        return img_base64, None
-                    except Exception as img_error:
-                        if debug_mode:
-                            debug_info.append(f"  ❌ 이미지 변환 실패: {str(img_error)}")
-                        continue
-                else:
-                    # JSON 응답 확인
-                    try:
-                        error_data = response.json()
-                        if debug_mode:
-                            debug_info.append(f"  ❌ JSON 응답: {error_data}")
-                        continue
-                    except:
-                        if debug_mode:
-                            debug_info.append(f"  ❌ 예상치 못한 응답")
-                        continue
+        if response.status_code == 200:
+            content_type = response.headers.get('content-type', '')
             
-            elif response.status_code == 503:
+            # 이미지 데이터인 경우
+            if 'image' in content_type or len(response.content) > 1000:
                 try:
-                    error_data = response.json()
-                    estimated_time = error_data.get('estimated_time', 20)
-                    if debug_mode:
-                        debug_info.append(f"  ⏳ 모델 로딩 중 (약 {estimated_time}초)")
-                    
-                    if model_idx == len(HUGGINGFACE_MODELS) - 1:
-                        return None, f"⏳ 모델 로딩 중입니다. 약 {estimated_time}초 후 다시 시도해주세요."
-                    else:
-                        continue
-                except:
-                    continue
-            
-            elif response.status_code == 404:
-                if debug_mode:
-                    debug_info.append(f"  ❌ 404: 모델을 찾을 수 없음")
-                continue
-            
-            elif response.status_code == 401:
-                return None, "❌ API 키가 유효하지 않습니다. Secrets에서 HUGGINGFACE_API_KEY를 확인해주세요."
-            
-            elif response.status_code == 429:
-                return None, "⚠️ API 사용 한도를 초과했습니다. 잠시 후 다시 시도해주세요."
-            
+                    image = Image.open(BytesIO(response.content))
+                    buffered = BytesIO()
+                    image.save(buffered, format="PNG")
+                    result['image'] = base64.b64encode(buffered.getvalue()).decode()
+                    result['status'] = 'ok'
+                    info.append(f"  ✅ 성공!")
+                except Exception as img_error:
+                    info.append(f"  ❌ 이미지 변환 실패: {str(img_error)}")
             else:
-                if debug_mode:
-                    try:
-                        error_data = response.json()
-                        debug_info.append(f"  ❌ 에러: {error_data.get('error', 'Unknown')}")
-                    except:
-                        debug_info.append(f"  ❌ HTTP {response.status_code}")
-                continue
-                
-        except requests.exceptions.Timeout:
-            if debug_mode:
-                debug_info.append(f"  ⏱️ 타임아웃")
-            continue
+                # JSON 응답 확인
+                try:
+                    info.append(f"  ❌ JSON 응답: {response.json()}")
+                except:
+                    info.append(f"  ❌ 예상치 못한 응답")
         
-        except requests.exceptions.ConnectionError:
-            return None, "❌ 네트워크 연결 오류. 인터넷 연결을 확인해주세요."
+        elif response.status_code == 503:
+            result['status'] = 'loading'
+            try:
+                result['estimated_time'] = response.json().get('estimated_time', 20)
+            except:
+                result['estimated_time'] = 20
+            info.append(f"  ⏳ 모델 로딩 중 (약 {result['estimated_time']}초)")
         
-        except Exception as e:
-            if debug_mode:
-                debug_info.append(f"  ❌ 예외: {str(e)}")
-            if model_idx == len(HUGGINGFACE_MODELS) - 1:
-                if debug_mode:
-                    return None, "\n".join(debug_info)
-                return None, f"❌ 예상치 못한 오류: {str(e)}"
+        elif response.status_code == 404:
+            result['status'] = 'not_found'
+            info.append(f"  ❌ 404: 모델을 찾을 수 없음")
+        
+        elif response.status_code == 401:
+            result['status'] = 'auth'
+        
+        elif response.status_code == 429:
+            result['status'] = 'rate_limited'
+        
+        else:
+            try:
+                info.append(f"  ❌ 에러: {response.json().get('error', 'Unknown')}")
+            except:
+                info.append(f"  ❌ HTTP {response.status_code}")
+    
+    except requests.exceptions.Timeout:
+        result['status'] = 'timeout'
+        info.append(f"  ⏱️ 타임아웃")
+    
+    except requests.exceptions.ConnectionError:
+        result['status'] = 'network'
+        info.append(f"  ❌ 네트워크 연결 오류")
+    
+    except Exception as e:
+        info.append(f"  ❌ 예외: {str(e)}")
+    
+    return result
+
+# Hugging Face 이미지 생성 (디버깅 강화)
+def generate_image_with_huggingface(prompt, negative_prompt="", debug_mode=False, use_cache=True):
+    """
+    Hugging Face Stable Diffusion으로 이미지 생성
+    상위 모델 여러 개에 동시에(또는 HEDGE_DELAY 간격으로) 요청해 가장 먼저 성공한 이미지를 사용
+    use_cache=False: 캐시를 읽지 않고 새로 생성 (결과는 캐시에 덮어씀, 재생성용)
+    """
+    if not HUGGINGFACE_ENABLED:
+        return None, "Hugging Face API 키가 설정되지 않았습니다."
+    
+    cache_key = ImageCache.make_key("huggingface", prompt, negative_prompt, 0, 0)  # 크기는 모델 기본값
+    if use_cache and image_cache is not None:
+        cached = image_cache.get(cache_key)
+        if cached is not None:
+            return base64.b64encode(cached).decode(), ("💾 캐시된 이미지 사용" if debug_mode else None)
+    
+    debug_info = []
+    
+    # 최근 503/404를 돌려준 모델은 쿨다운 동안 건너뜀 (모두 쉬는 중이면 전부 시도)
+    now = time.time()
+    candidates = [m for m in HUGGINGFACE_MODELS if model_cooldowns.get(m, 0) <= now]
+    skipped = [m for m in HUGGINGFACE_MODELS if m not in candidates]
+    if not candidates:
+        candidates, skipped = list(HUGGINGFACE_MODELS), []
+    if skipped:
+        debug_info.append(f"쿨다운으로 건너뜀: {', '.join(skipped)}")
+    
+    width = max(1, HUGGINGFACE_RACE_WIDTH)
+    queue = list(candidates)
+    running = {}
+    results = []
+    
+    def launch():
+        if queue:
+            model_name = queue.pop(0)
+            running[http_executor.submit(_request_huggingface_model, model_name, prompt, negative_prompt, use_cache)] = model_name
+    
+    launch()
+    if HUGGINGFACE_HEDGE_DELAY <= 0:
+        while queue and len(running) < width:
+            launch()
+    
+    winner, fatal = None, None
+    while running and winner is None and fatal is None:
+        hedge = HUGGINGFACE_HEDGE_DELAY > 0 and queue and len(running) < width
+        done, _ = wait(list(running), timeout=HUGGINGFACE_HEDGE_DELAY if hedge else None, return_when=FIRST_COMPLETED)
+        if not done:
+            # 헤지 지연 경과 → 다음 모델도 함께 요청
+            launch()
             continue
+        
+        for future in done:
+            running.pop(future)
+            result = future.result()
+            results.append(result)
+            debug_info.extend(result['info'])
+            if result['status'] == 'ok':
+                winner = result
+                break
+            if result['status'] in ('loading', 'not_found'):
+                model_cooldowns[result['model']] = time.time() + HUGGINGFACE_COOLDOWN
+            if result['status'] in ('auth', 'rate_limited', 'network'):
+                fatal = result
+                break
+            launch()
+    
+    # 남은 요청은 결과를 버림 (시작 전이면 취소)
+    for future in running:
+        future.cancel()
+    
+    if winner:
+        if image_cache is not None:
+            image_cache.put(cache_key, base64.b64decode(winner['image']))
+        if debug_mode:
+            return winner['image'], "\n".join(debug_info)
+        if winner['model'] != HUGGINGFACE_MODELS[0]:
+            st.info(f"✅ 대체 모델 사용: {winner['model']}")
+        return winner['image'], None
+    
+    if fatal and fatal['status'] == 'auth':
+        return None, "❌ API 키가 유효하지 않습니다. Secrets에서 HUGGINGFACE_API_KEY를 확인해주세요."
+    if fatal and fatal['status'] == 'rate_limited':
+        return None, "⚠️ API 사용 한도를 초과했습니다. 잠시 후 다시 시도해주세요."
+    if fatal and fatal['status'] == 'network':
+        return None, "❌ 네트워크 연결 오류. 인터넷 연결을 확인해주세요."
     
     # 모든 모델 실패
     if debug_mode:
         return None, "\n".join(debug_info)
     
+    loading = [r['estimated_time'] for r in results if r['status'] == 'loading']
+    if loading:
+        return None, f"⏳ 모델 로딩 중입니다. 약 {min(loading)}초 후 다시 시도해주세요."
+    
     return None, "❌ 모든 Hugging Face 모델에서 실패했습니다."
 
 def create_emotion_prompt_for_huggingface(emotion_summary, keywords):
@@ -367,79 +1483,249 @@ def create_emotion_prompt_for_huggingface(emotion_summary, keywords):
     
     return prompt, negative_prompt
 
+def prewarm_image_cache():
+    """감정별 기본 스타일(키워드 없음) 이미지를 미리 생성해 캐시에 채움 (작업 스레드에서 실행)"""
+    for emotion in ['joy', 'sadness', 'anger', 'anxiety', 'calmness']:
+        summary = {e: (1 if e == emotion else 0) for e in ['joy', 'sadness', 'anger', 'anxiety', 'calmness']}
+        prompt, _ = create_emotion_prompt_for_huggingface(summary, [])
+        if ImageCache.make_key("pollinations", prompt) not in image_cache:
+            generate_image_with_pollinations(prompt)
+
+@st.cache_resource
+def start_image_cache_prewarm():
+    """프로세스당 한 번만 백그라운드 사전 생성 시작"""
+    return http_executor.submit(prewarm_image_cache)
+
+if IMAGE_CACHE_PREWARM and image_cache is not None:
+    start_image_cache_prewarm()
+
+# 이미지 blob 저장소 ("sheet": 기존처럼 셀에 압축 저장, "local": 내용 주소 방식 파일 저장소)
+# Streamlit Cloud 컨테이너는 재시작 시 파일이 지워지므로 "local"은 디스크가 유지되는 환경에서만 사용
+IMAGE_BLOB_STORE = str(get_config("IMAGE_BLOB_STORE", "sheet")).lower()
+IMAGE_BLOB_DIR = get_config("IMAGE_BLOB_DIR", os.path.join(LOCAL_DATA_DIR, "blobs"))
+THUMBNAIL_MAX_CHARS = 8000  # 시트에 남기는 썸네일(base64) 최대 길이
+
+class LocalBlobStore:
+    """
+    내용 해시(sha256)를 파일 ID로 쓰는 로컬 blob 저장소
+    Google Drive와 비슷한 인터페이스: upload() → file_id, open()/download()로 읽기
+    """
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+    
+    def _path(self, file_id):
+        if not re.fullmatch(r'[0-9a-f]{64}', file_id or ''):
+            raise ValueError(f"잘못된 파일 ID: {file_id}")
+        return os.path.join(self.root, file_id[:2], file_id)
+    
+    def upload(self, data, mime_type="application/octet-stream"):
+        """같은 내용은 한 번만 저장하고 파일 ID 반환 (mime_type은 시트의 참조에 기록)"""
+        file_id = hashlib.sha256(data).hexdigest()
+        path = self._path(file_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return file_id
+    
+    def exists(self, file_id):
+        return os.path.exists(self._path(file_id))
+    
+    def open(self, file_id):
+        """읽기용 파일 객체 (스트리밍)"""
+        return open(self._path(file_id), 'rb')
+    
+    def iter_chunks(self, file_id):
+        with self.open(file_id) as f:
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    
+    def download(self, file_id):
+        return b"".join(self.iter_chunks(file_id))
+
+@st.cache_resource
+def get_blob_store(kind):
+    if kind != "local":
+        return None
+    try:
+        return LocalBlobStore(IMAGE_BLOB_DIR)
+    except Exception:
+        return None
+
+blob_store = get_blob_store(IMAGE_BLOB_STORE)
+
+def make_image_ref(blob_id, mime_type, thumbnail_base64):
+    """시트 image_url 셀에 넣는 blob 참조 (해시 + 작은 썸네일)"""
+    return json.dumps({'blob': blob_id, 'mime': mime_type, 'thumb': thumbnail_base64}, separators=(',', ':'))
+
+def parse_image_ref(image_url):
+    """blob 참조면 dict, 예전 방식(base64 그대로)이면 None"""
+    if not isinstance(image_url, str) or not image_url.startswith('{'):
+        return None
+    try:
+        ref = json.loads(image_url)
+        return ref if 'blob' in ref else None
+    except ValueError:
+        return None
+
+# 이미지 압축 설정 ("JPEG" 또는 "JPEG,WEBP" - WebP는 Pillow가 지원할 때만 사용)
+IMAGE_COMPRESS_FORMATS = [
+    f.strip().upper() for f in str(get_config("IMAGE_COMPRESS_FORMATS", "JPEG")).split(',')
+    if f.strip() and (f.strip().upper() != "WEBP" or features.check('webp'))
+] or ["JPEG"]
+
+def base64_budget_bytes(max_chars):
+    """base64 문자 수 한도 → 원본 바이트 한도"""
+    return max_chars // 4 * 3
+
+def compress_image_to_budget(image, max_bytes, max_dim=None, min_dim=64, formats=None, quality_range=(30, 90)):
+    """
+    이미지를 한 번만 디코딩해 픽셀 버퍼를 메모리에 두고, 바이트 예산 안에서
+    가장 큰 크기 → 가장 높은 품질 순으로 이분 탐색
+    반환: (압축된 bytes 또는 None, 선택된 설정과 소요 시간 report)
+    """
+    started = time.perf_counter()
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(BytesIO(image))
+        image.load()
+    decode_ms = (time.perf_counter() - started) * 1000
+    
+    search_started = time.perf_counter()
+    base = image.convert('RGB') if image.mode != 'RGB' else image
+    full_dim = max(base.size)
+    max_dim = min(max_dim or full_dim, full_dim)
+    min_dim = min(min_dim, max_dim)
+    q_min, q_max = quality_range
+    
+    resized_cache, encoded_cache = {}, {}
+    
+    def resized(dim):
+        if dim not in resized_cache:
+            if dim >= full_dim:
+                resized_cache[dim] = base
+            else:
+                scale = dim / full_dim
+                size = (max(1, round(base.width * scale)), max(1, round(base.height * scale)))
+                resized_cache[dim] = base.resize(size, Image.Resampling.LANCZOS)
+        return resized_cache[dim]
+    
+    def encode(dim, fmt, quality):
+        key = (dim, fmt, quality)
+        if key not in encoded_cache:
+            buffered = BytesIO()
+            options = {'optimize': True} if fmt == "JPEG" else {'method': 4}
+            resized(dim).save(buffered, format=fmt, quality=quality, **options)
+            encoded_cache[key] = buffered.getvalue()
+        return encoded_cache[key]
+    
+    def fits(dim, fmt, quality):
+        return len(encode(dim, fmt, quality)) <= max_bytes
+    
+    best = None
+    for fmt in (formats or IMAGE_COMPRESS_FORMATS):
+        # 1) 최저 품질로 들어가는 가장 큰 크기
+        if fits(max_dim, fmt, q_min):
+            dim = max_dim
+        elif not fits(min_dim, fmt, q_min):
+            continue
+        else:
+            lo, hi = min_dim, max_dim
+            while hi - lo > 8:
+                mid = (lo + hi) // 2
+                if fits(mid, fmt, q_min):
+                    lo = mid
+                else:
+                    hi = mid
+            dim = lo
+        
+        # 2) 그 크기에서 들어가는 가장 높은 품질
+        if fits(dim, fmt, q_max):
+            quality = q_max
+        else:
+            lo, hi = q_min, q_max
+            while hi - lo > 2:
+                mid = (lo + hi) // 2
+                if fits(dim, fmt, mid):
+                    lo = mid
+                else:
+                    hi = mid
+            quality = lo
+        
+        candidate = (dim, quality, fmt)
+        if best is None or candidate[:2] > best[:2]:
+            best = candidate
+    
+    report = {
+        'original_dims': image.size, 'decode_ms': decode_ms,
+        'encodes': len(encoded_cache), 'search_ms': (time.perf_counter() - search_started) * 1000
+    }
+    report['total_ms'] = report['decode_ms'] + report['search_ms']
+    if best is None:
+        return None, report
+    
+    dim, quality, fmt = best
+    data = encode(dim, fmt, quality)
+    report.update({'format': fmt, 'quality': quality, 'dims': resized(dim).size, 'bytes': len(data)})
+    return data, report
+
+def make_thumbnail_base64(image, max_chars=THUMBNAIL_MAX_CHARS):
+    """시트에 남길 작은 썸네일 (base64)"""
+    data, _ = compress_image_to_budget(image, base64_budget_bytes(max_chars), max_dim=160, min_dim=32)
+    return base64.b64encode(data).decode() if data else ""
+
 # Google Drive 이미지 저장 함수 (선택적)
 def save_image_to_drive(date_str, image_base64, prompt):
     """
-    Google Drive에 이미지 저장 (더 큰 파일 지원)
-    Sheets에는 Drive URL만 저장
+    원본 이미지는 blob 저장소에 원본 해상도 그대로 저장
+    Sheets에는 해시와 작은 썸네일만 저장
     """
     try:
-        # Google Drive API 사용 (추가 설정 필요)
-        # 현재는 압축된 버전만 Sheets에 저장
-        return save_metaphor_image(date_str, image_base64, prompt)
-    except:
-        return save_metaphor_image(date_str, image_base64, prompt)
+        image_bytes = base64.b64decode(image_base64)
+        img = Image.open(BytesIO(image_bytes))
+        img.load()
+        mime_type = Image.MIME.get(img.format, "image/png")
+        blob_id = blob_store.upload(image_bytes, mime_type)
+        
+        if len(prompt) > 1000:
+            prompt = prompt[:997] + "..."
+        
+        storage.upsert_metaphor(date_str, make_image_ref(blob_id, mime_type, make_thumbnail_base64(img)), prompt)
+        return True
+    except Exception as e:
+        st.error(f"❌ 저장 오류: {e}")
+        return False
 
 def save_metaphor_image(date_str, image_base64, prompt):
-    """메타포 이미지를 Google Sheets에 저장 (자동 압축)"""
+    """메타포 이미지를 저장 (blob 저장소 사용 시 원본 보관, 아니면 Google Sheets 셀에 자동 압축)"""
+    if blob_store is not None:
+        return save_image_to_drive(date_str, image_base64, prompt)
+    
     try:
         original_size = len(image_base64)
         
         # Base64 이미지가 너무 크면 압축
         if original_size > 40000:  # 안전 마진 10000자
             try:
-                # Base64를 이미지로 디코딩
-                img_data = base64.b64decode(image_base64)
-                img = Image.open(BytesIO(img_data))
+                compressed, report = compress_image_to_budget(
+                    base64.b64decode(image_base64), base64_budget_bytes(40000), min_dim=100
+                )
                 
-                original_dims = img.size
-                
-                # 이미지 크기에 따라 압축 레벨 결정
-                if original_size > 100000:
-                    max_size = (200, 200)
-                    quality = 60
-                elif original_size > 70000:
-                    max_size = (256, 256)
-                    quality = 65
-                else:
-                    max_size = (300, 300)
-                    quality = 70
-                
-                # 이미지 리사이즈
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # JPEG로 변환하여 용량 줄이기
-                buffered = BytesIO()
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                img.save(buffered, format="JPEG", quality=quality, optimize=True)
-                
-                # 다시 Base64로 인코딩
-                compressed_base64 = base64.b64encode(buffered.getvalue()).decode()
-                
-                # 여전히 크면 더 압축
-                attempt = 1
-                while len(compressed_base64) > 40000 and attempt < 5:
-                    quality = max(30, quality - 10)
-                    max_size = (max(100, max_size[0] - 50), max(100, max_size[1] - 50))
-                    
-                    img_data = base64.b64decode(image_base64)
-                    img = Image.open(BytesIO(img_data))
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    
-                    buffered = BytesIO()
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        img = img.convert('RGB')
-                    img.save(buffered, format="JPEG", quality=quality, optimize=True)
-                    compressed_base64 = base64.b64encode(buffered.getvalue()).decode()
-                    attempt += 1
-                
-                compressed_size = len(compressed_base64)
-                compression_ratio = (1 - compressed_size / original_size) * 100
-                
-                if compressed_size < 40000:
-                    image_base64 = compressed_base64
-                    st.success(f"📦 이미지 압축 완료: {original_dims} → {img.size}, {compression_ratio:.1f}% 절감")
+                if compressed:
+                    image_base64 = base64.b64encode(compressed).decode()
+                    compression_ratio = (1 - len(image_base64) / original_size) * 100
+                    st.success(
+                        f"📦 이미지 압축 완료: {report['original_dims']} → {report['dims']}, "
+                        f"{report['format']} 품질 {report['quality']}, {compression_ratio:.1f}% 절감 "
+                        f"({report['encodes']}회 인코딩, {report['total_ms']:.0f}ms)"
+                    )
                 else:
                     st.warning("⚠️ 이미지가 너무 큽니다. 썸네일만 저장됩니다.")
                     image_base64 = "too_large_thumbnail_only"
@@ -448,25 +1734,11 @@ def save_metaphor_image(date_str, image_base64, prompt):
                 st.warning(f"⚠️ 이미지 압축 실패: {compress_error}")
                 image_base64 = "compression_failed"
         
-        all_values = metaphor_worksheet.get_all_values()
-        row_index = None
-        
-        for idx, row in enumerate(all_values[1:], start=2):
-            if len(row) > 0 and row[0] == date_str:
-                row_index = idx
-                break
-        
         # 프롬프트도 길이 제한
         if len(prompt) > 1000:
             prompt = prompt[:997] + "..."
         
-        row_data = [date_str, image_base64, prompt, datetime.now().isoformat()]
-        
-        if row_index:
-            metaphor_worksheet.update(f'A{row_index}:D{row_index}', [row_data])
-        else:
-            metaphor_worksheet.append_row(row_data)
-        
+        storage.upsert_metaphor(date_str, image_base64, prompt)
         return True
     except Exception as e:
         # 더 상세한 에러 메시지
@@ -479,188 +1751,849 @@ def save_metaphor_image(date_str, image_base64, prompt):
         return False
 
 def load_metaphor_image(date_str):
-    """저장된 메타포 이미지 불러오기"""
+    """저장된 메타포 이미지 불러오기 (이미지 bytes, 프롬프트)"""
     try:
-        records = metaphor_worksheet.get_all_records()
-        for record in records:
-            if record.get('date') == date_str:
-                image_url = record.get('image_url')
-                prompt = record.get('prompt')
-                
-                # 특수 표시 확인
-                if image_url in ["too_large", "too_large_thumbnail_only", "compression_failed"]:
-                    st.info("💡 이 날짜의 원본 이미지는 너무 커서 저장되지 않았습니다.")
-                    return None, prompt
-                
-                return image_url, prompt
-        return None, None
+        image_url, prompt = storage.load_metaphor(date_str)
+        if not image_url:
+            return None, prompt
+        
+        # 특수 표시 확인
+        if image_url in ["too_large", "too_large_thumbnail_only", "compression_failed"]:
+            st.info("💡 이 날짜의 원본 이미지는 너무 커서 저장되지 않았습니다.")
+            return None, prompt
+        
+        ref = parse_image_ref(image_url)
+        if ref is None:
+            # 예전 방식: 셀에 base64 이미지가 그대로 있음
+            return base64.b64decode(image_url), prompt
+        
+        if blob_store is not None and blob_store.exists(ref['blob']):
+            return blob_store.download(ref['blob']), prompt
+        
+        if ref.get('thumb'):
+            st.info("💡 원본 이미지를 찾을 수 없어 썸네일을 표시합니다.")
+            return base64.b64decode(ref['thumb']), prompt
+        return None, prompt
     except:
         return None, None
 
+# 일기 스냅샷 캐시 (세션별)
+# Streamlit은 상호작용마다 스크립트 전체를 재실행하므로, 실행(rerun)마다 새 ID를 발급
+RERUN_ID = uuid.uuid4().hex
+# 0 이하: 실행(rerun)당 1회 조회, 양수: 해당 초 동안 재사용
+DIARY_SNAPSHOT_TTL = float(get_config("DIARY_SNAPSHOT_TTL", 60))
+
+def _diary_snapshot_stats():
+    if '_diary_snapshot_stats' not in st.session_state:
+        st.session_state._diary_snapshot_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    return st.session_state._diary_snapshot_stats
+
+def _diary_snapshot_valid(snapshot):
+    if snapshot is None:
+        return False
+    if DIARY_SNAPSHOT_TTL <= 0:
+        return snapshot['rerun_id'] == RERUN_ID
+    return time.time() - snapshot['loaded_at'] < DIARY_SNAPSHOT_TTL
+
+def get_diary_snapshot():
+    """일기 시트 스냅샷 반환 (실행당 또는 TTL당 1회만 Sheets 조회)"""
+    stats = _diary_snapshot_stats()
+    snapshot = st.session_state.get('_diary_snapshot')
+    if _diary_snapshot_valid(snapshot):
+        stats['hits'] += 1
+        return snapshot['data']
+    
+    stats['misses'] += 1
+    snapshot = {
+        'data': load_data_from_sheets(),
+        'loaded_at': time.time(),
+        'rerun_id': RERUN_ID,
+        'version': (snapshot['version'] + 1) if snapshot else 1
+    }
+    st.session_state._diary_snapshot = snapshot
+    return snapshot['data']
+
+def invalidate_diary_snapshot():
+    """저장/삭제 후 스냅샷 무효화 (다음 조회 시 다시 불러옴)"""
+    snapshot = st.session_state.get('_diary_snapshot')
+    if snapshot is not None:
+        # 버전은 유지하고 만료만 표시
+        snapshot['loaded_at'] = float('-inf')
+        snapshot['rerun_id'] = None
+        _diary_snapshot_stats()['invalidations'] += 1
+
+def get_diary_snapshot_stats():
+    """스냅샷 캐시 적중/미스 카운터"""
+    stats = dict(_diary_snapshot_stats())
+    snapshot = st.session_state.get('_diary_snapshot')
+    stats['version'] = snapshot['version'] if snapshot else 0
+    return stats
+
 # 데이터 함수들
 def load_data_from_sheets():
     try:
-        records = diary_worksheet.get_all_records()
-        data = {}
-        for record in records:
-            if record.get('date'):
-                date_str = record['date']
-                keywords_str = record.get('keywords', '[]')
-                try:
-                    keywords = json.loads(keywords_str) if isinstance(keywords_str, str) else keywords_str
-                except:
-                    keywords = keywords_str.split(',') if keywords_str else []
-                
-                data[date_str] = {
-                    'date': date_str, 'content': record.get('content', ''),
-                    'keywords': keywords, 'total_score': float(record.get('total_score', 0)),
-                    'joy': int(record.get('joy', 0)), 'sadness': int(record.get('sadness', 0)),
-                    'anger': int(record.get('anger', 0)), 'anxiety': int(record.get('anxiety', 0)),
-                    'calmness': int(record.get('calmness', 0)), 'message': record.get('message', '')
-                }
-        return data
+        return storage.load_all()
     except:
         return {}
 
 def save_data_to_sheets(date_str, item_data):
     try:
-        all_values = diary_worksheet.get_all_values()
-        row_index = None
-        
-        for idx, row in enumerate(all_values[1:], start=2):
-            if len(row) > 0 and row[0] == date_str:
-                row_index = idx
-                break
-        
-        keywords_str = json.dumps(item_data['keywords'], ensure_ascii=False)
-        row_data = [
-            str(date_str), str(item_data['content']), str(keywords_str), float(item_data['total_score']),
-            int(item_data['joy']), int(item_data['sadness']), int(item_data['anger']),
-            int(item_data['anxiety']), int(item_data['calmness']), str(item_data['message']),
-            datetime.now().isoformat()
-        ]
-        
-        if row_index:
-            diary_worksheet.update(f'A{row_index}:K{row_index}', [row_data])
-        else:
-            diary_worksheet.append_row(row_data)
-        
+        storage.upsert_diary(date_str, item_data)
+        invalidate_diary_snapshot()
+        notify_diary_change(date_str, item_data)
         return True
     except Exception as e:
         st.error(f"저장 오류: {e}")
         return False
 
-def delete_data_from_sheets(date_str):
-    try:
-        all_values = diary_worksheet.get_all_values()
-        for idx, row in enumerate(all_values[1:], start=2):
-            if row[0] == date_str:
-                diary_worksheet.delete_rows(idx)
-                return True
-        return False
-    except:
-        return False
+def delete_data_from_sheets(date_str):
+    try:
+        if not storage.delete_diary(date_str):
+            return False
+        invalidate_diary_snapshot()
+        notify_diary_change(date_str, None)
+        return True
+    except:
+        return False
+
+def get_latest_data():
+    data = get_diary_snapshot()
+    items = sorted(data.values(), key=lambda x: x["date"])[-30:]
+    return data, items
+
+# 전문가 조언 저장소 (date → expert_type → 조언, 메모리 맵)
+EXPERT_ADVICE_TTL = float(get_config("EXPERT_ADVICE_TTL", 300))  # 외부 수정 대비 재조회 주기(초)
+
+class ExpertAdviceStore:
+    """
+    조언 시트를 한 번 읽어 날짜별로 보관하고, 저장 시 증분 갱신
+    preload()로 선택 목록의 날짜를 한 번에 채워두면 날짜를 바꿔도 다시 읽지 않음
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = threading.RLock()
+        self._by_date = {}
+        self._loaded_at = time.time()
+        self.stats = {'hits': 0, 'loads': 0}
+    
+    def _expire(self):
+        if time.time() - self._loaded_at >= EXPERT_ADVICE_TTL:
+            self._by_date = {}
+            self._loaded_at = time.time()
+    
+    def preload(self, dates):
+        """주어진 날짜들의 조언을 (없는 날짜만) 한 번에 불러옴"""
+        with self.lock:
+            self._expire()
+            missing = [d for d in dates if d not in self._by_date]
+            if not missing:
+                self.stats['hits'] += 1
+                return
+            self.stats['loads'] += 1
+            for date_str, advice_data in self.storage.load_advice_for_dates(missing).items():
+                self._by_date.setdefault(date_str, advice_data)
+    
+    def get(self, date_str):
+        self.preload([date_str])
+        with self.lock:
+            return dict(self._by_date.get(date_str, {}))
+    
+    def put(self, date_str, expert_type, advice, has_content):
+        self.put_many(date_str, {expert_type: {'advice': advice, 'has_content': has_content}})
+    
+    def put_many(self, date_str, advice_by_expert):
+        with self.lock:
+            if date_str in self._by_date:
+                for expert_type, result in advice_by_expert.items():
+                    self._by_date[date_str][expert_type] = {
+                        'advice': result['advice'], 'has_content': bool(result['has_content']),
+                        'created_at': datetime.now().isoformat()
+                    }
+    
+    def __len__(self):
+        return len(self._by_date)
+
+@st.cache_resource
+def get_expert_advice_store():
+    # storage도 프로세스 전역 캐시이므로 한 번만 생성
+    return ExpertAdviceStore(storage)
+
+expert_advice_store = get_expert_advice_store()
+
+def save_expert_advice_to_sheets(date_str, expert_type, advice, has_content):
+    try:
+        storage.upsert_advice(date_str, expert_type, advice, has_content)
+        expert_advice_store.put(date_str, expert_type, advice, has_content)
+        return True
+    except:
+        return False
+
+def save_expert_advice_batch(date_str, advice_by_expert):
+    """여러 전문가 조언을 한 번의 쓰기로 저장"""
+    if not advice_by_expert:
+        return True
+    try:
+        storage.upsert_advice_many(date_str, advice_by_expert)
+        expert_advice_store.put_many(date_str, advice_by_expert)
+        return True
+    except:
+        return False
+
+def load_expert_advice_from_sheets(date_str):
+    try:
+        return expert_advice_store.get(date_str)
+    except:
+        return {}
+
+def preload_expert_advice(dates):
+    """날짜 선택 목록에 표시될 모든 날짜의 조언을 미리 불러옴"""
+    try:
+        expert_advice_store.preload(dates)
+    except:
+        pass
+
+# 컬럼형 일기 데이터 (스냅샷당 1회 생성, 통계는 NumPy 벡터 연산)
+EMOTION_KEYS = ['joy', 'sadness', 'anger', 'anxiety', 'calmness']
+
+class DiaryFrame:
+    """
+    날짜순 일기 목록 → 컬럼 배열
+    ordinals: 날짜(일 단위 정수), emotions: (n, 5) 감정 점수, total: 종합 점수, char_counts: 글자 수
+    tail()/슬라이스는 배열 view를 공유하므로 복사 비용 없음
+    """
+    def __init__(self, items, _arrays=None):
+        self.items = items
+        if _arrays is not None:
+            self.ordinals, self.emotions, self.total, self.char_counts = _arrays
+            return
+        n = len(items)
+        self.ordinals = self._parse_dates([item['date'] for item in items])
+        self.emotions = np.array(
+            [[item[k] for k in EMOTION_KEYS] for item in items], dtype=np.float64
+        ).reshape(n, len(EMOTION_KEYS))
+        self.total = np.array([item['total_score'] for item in items], dtype=np.float64)
+        self.char_counts = np.array([len(item['content']) for item in items], dtype=np.int64)
+    
+    @staticmethod
+    def _parse_dates(dates):
+        try:
+            return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+        except ValueError:
+            # 시트에서 직접 고친 잘못된 날짜가 섞여 있으면 개별 변환
+            ordinals = []
+            for d in dates:
+                try:
+                    ordinals.append(np.datetime64(str(d)[:10], 'D').astype(np.int64))
+                except ValueError:
+                    ordinals.append(ordinals[-1] if ordinals else 0)
+            return np.array(ordinals, dtype=np.int64)
+    
+    @classmethod
+    def from_data(cls, data):
+        return cls(sorted(data.values(), key=lambda x: x['date']))
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def __getitem__(self, sl):
+        return DiaryFrame(self.items[sl], (
+            self.ordinals[sl], self.emotions[sl], self.total[sl], self.char_counts[sl]
+        ))
+    
+    def tail(self, n):
+        if n <= 0:
+            return self[len(self):]  # self[-0:]은 전체 구간
+        return self[-n:] if n < len(self) else self
+    
+    @property
+    def dates(self):
+        return [item['date'] for item in self.items]
+    
+    def emotion(self, key):
+        return self.emotions[:, EMOTION_KEYS.index(key)]
+    
+    def index_range(self, start_date, end_date):
+        """[start_date, end_date] 날짜 구간 → 인덱스 [lo, hi) (이진 탐색)"""
+        lo = int(np.searchsorted(self.ordinals, np.datetime64(start_date, 'D').astype(np.int64), 'left'))
+        hi = int(np.searchsorted(self.ordinals, np.datetime64(end_date, 'D').astype(np.int64), 'right'))
+        return lo, hi
+    
+    def rolling_mean(self, window):
+        """이동 평균 (누적합 차분) → (emotions (n-window+1, 5), total (n-window+1,))"""
+        if window <= 0 or window > len(self):
+            return np.zeros((0, len(EMOTION_KEYS))), np.zeros(0)
+        values = np.column_stack([self.emotions, self.total])
+        csum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+        rolled = (csum[window:] - csum[:-window]) / window
+        return rolled[:, :-1], rolled[:, -1]
+    
+    def month_count(self):
+        """일기가 있는 달 수"""
+        months = self.ordinals.astype('datetime64[D]').astype('datetime64[M]')
+        return len(np.unique(months))
+    
+    def correlation_matrix(self):
+        """감정 5×5 상관계수 (분산 0인 감정은 0)"""
+        if len(self) < 2:
+            return np.zeros((len(EMOTION_KEYS), len(EMOTION_KEYS)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.corrcoef(self.emotions, rowvar=False)
+        return np.nan_to_num(corr)
+
+def get_diary_frame():
+    """현재 스냅샷의 DiaryFrame (스냅샷 버전이 바뀔 때만 다시 생성)"""
+    data = get_diary_snapshot()
+    version = st.session_state._diary_snapshot['version']
+    cached = st.session_state.get('_diary_frame')
+    if cached is None or cached[0] != version:
+        frame = DiaryFrame.from_data(data)
+        frame.version = version
+        cached = (version, frame)
+        st.session_state._diary_frame = cached
+    return cached[1]
+
+# 저장/삭제를 받아 스스로 갱신하는 파생 통계 (세션별)
+def _diary_listeners():
+    if '_diary_listeners' not in st.session_state:
+        st.session_state._diary_listeners = {}
+    return st.session_state._diary_listeners
+
+def notify_diary_change(date_str, item_data):
+    """
+    저장(item_data) 또는 삭제(None)를 파생 통계에 반영
+    스냅샷과 맞던 통계에는 저장 후 다시 읽힐 스냅샷 버전(현재 + 1)을 미리 기록해
+    다음 실행의 matches()가 전체 비교 없이 통과하도록 함
+    """
+    snapshot = st.session_state.get('_diary_snapshot')
+    next_version = snapshot['version'] + 1 if snapshot else None
+    for listener in _diary_listeners().values():
+        # 같은 무효화 구간 안의 두 번째 저장이면 이미 다음 버전이 기록되어 있음
+        in_sync = next_version is not None and listener.version in (next_version - 1, next_version)
+        try:
+            listener.apply(date_str, item_data)
+        except Exception:
+            listener.stale = True
+        if in_sync and not listener.stale:
+            listener.version = next_version
+
+# 감정 상관관계 증분 엔진
+EMOTION_NETWORK_WINDOW = int(get_config("EMOTION_NETWORK_WINDOW", 30))  # 네트워크에 쓰는 최근 일기 수
+
+class EmotionCorrelationEngine:
+    """
+    최근 window개 일기의 감정 합, 제곱합/교차곱(5×5)을 유지
+    새 일기·수정은 합계에 더하고 빼는 O(1) 갱신, 상관계수 행렬은 합계에서 바로 계산
+    """
+    def __init__(self, window):
+        self.window = window
+        self.stale = False
+        self.version = None
+        self._vectors = {}  # date → 감정 벡터
+        self._dates = deque()  # 창 안의 날짜 (오름차순)
+        self._sum = np.zeros(len(EMOTION_KEYS))
+        self._cross = np.zeros((len(EMOTION_KEYS), len(EMOTION_KEYS)))
+        self.stats = {'updates': 0, 'rebuilds': 0}
+    
+    def load(self, frame):
+        """frame의 최근 window개로 합계를 한 번에 계산"""
+        recent = frame.tail(self.window)
+        self._dates = deque(recent.dates)
+        self._vectors = dict(zip(recent.dates, recent.emotions.copy()))
+        self._sum = recent.emotions.sum(axis=0)
+        self._cross = recent.emotions.T @ recent.emotions
+        self.version = getattr(frame, 'version', None)
+        self.stale = False
+        self.stats['rebuilds'] += 1
+    
+    def matches(self, frame):
+        """
+        스냅샷이 다시 읽혔을 때 누적 상태가 그대로 유효한지 확인
+        자기 저장 뒤에는 버전이 같아 바로 통과하고, TTL 만료 등으로 다시 읽힌 경우만 전체 비교
+        """
+        if self.stale:
+            return False
+        version = getattr(frame, 'version', None)
+        if version is not None and version == self.version:
+            return True
+        recent = frame.tail(self.window)
+        same = list(self._dates) == recent.dates and np.array_equal(
+            np.array([self._vectors[d] for d in self._dates]).reshape(-1, len(EMOTION_KEYS)), recent.emotions
+        )
+        if same:
+            self.version = version
+        return same
+    
+    def _add(self, vector, sign):
+        self._sum += sign * vector
+        self._cross += sign * np.outer(vector, vector)
+    
+    def apply(self, date_str, item_data):
+        self.stats['updates'] += 1
+        old = self._vectors.get(date_str)
+        if item_data is None:
+            if old is not None:
+                # 창 앞쪽을 채울 이전 일기를 모르므로 다음 조회 때 다시 계산
+                self.stale = True
+            return
+        vector = np.array([item_data[k] for k in EMOTION_KEYS], dtype=np.float64)
+        if old is not None:
+            # 창 안의 일기 수정: 이전 값을 빼고 새 값을 더함
+            self._add(old, -1)
+            self._add(vector, 1)
+            self._vectors[date_str] = vector
+        elif not self._dates or date_str > self._dates[-1]:
+            # 가장 최근 날짜에 새 일기: 뒤에 넣고 창을 넘으면 가장 오래된 것 제거
+            self._dates.append(date_str)
+            self._vectors[date_str] = vector
+            self._add(vector, 1)
+            if len(self._dates) > self.window:
+                self._add(self._vectors.pop(self._dates.popleft()), -1)
+        elif len(self._dates) < self.window or date_str > self._dates[0]:
+            # 창 중간에 끼어드는 과거 날짜는 드물어 다시 계산
+            self.stale = True
+    
+    def __len__(self):
+        return len(self._dates)
+    
+    def matrix(self):
+        """감정 5×5 상관계수 (분산 0인 감정은 0)"""
+        n = len(self._dates)
+        size = len(EMOTION_KEYS)
+        if n < 2:
+            return np.zeros((size, size))
+        mean = self._sum / n
+        cov = self._cross / n - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        denom = np.outer(std, std)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.where(denom > 1e-12, cov / denom, 0.0)
+        np.fill_diagonal(corr, np.where(std > 1e-6, 1.0, 0.0))
+        return np.clip(corr, -1.0, 1.0)
+
+def get_correlation_engine(window=EMOTION_NETWORK_WINDOW):
+    """세션의 상관관계 엔진 (저장/삭제는 notify_diary_change로 증분 반영)"""
+    frame = get_diary_frame()
+    listeners = _diary_listeners()
+    key = f"correlation:{window}"
+    engine = listeners.get(key)
+    if engine is None:
+        engine = listeners[key] = EmotionCorrelationEngine(window)
+        engine.load(frame)
+    elif not engine.matches(frame):
+        engine.load(frame)
+    return engine
+
+# 주별/월별 집계 (저장/삭제 시 증분 갱신)
+ROLLUP_COLUMNS = EMOTION_KEYS + ['total', 'count', 'chars']
+
+def _day_number(date_str):
+    return int(np.datetime64(str(date_str)[:10], 'D').astype(np.int64))
+
+def _period_keys(resolution, day_numbers):
+    """일 번호 → 주(월요일 시작) 또는 월 번호"""
+    day_numbers = np.asarray(day_numbers, dtype=np.int64)
+    if resolution == 'week':
+        return (day_numbers + 3) // 7  # 1970-01-01은 목요일
+    return day_numbers.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+def _period_label(resolution, key):
+    if resolution == 'week':
+        return str(np.datetime64(int(key) * 7 - 3, 'D'))
+    return str(np.datetime64(int(key), 'M'))
+
+class DiaryRollups:
+    """
+    기간(주/월)별 감정 합계, 종합 점수 합계, 일기 수, 글자 수
+    저장·수정·삭제는 해당 기간 합계에서 이전 값을 빼고 새 값을 더함
+    """
+    RESOLUTIONS = ('week', 'month')
+    
+    def __init__(self):
+        self.stale = False
+        self.version = None
+        self._rows = {}  # date → 집계 행 (ROLLUP_COLUMNS 순서)
+        self._sums = {resolution: {} for resolution in self.RESOLUTIONS}
+        self.stats = {'updates': 0, 'rebuilds': 0}
+    
+    @staticmethod
+    def _row(item_data):
+        return np.array(
+            [item_data[k] for k in EMOTION_KEYS] + [item_data['total_score'], 1, len(item_data['content'])],
+            dtype=np.float64
+        )
+    
+    def load(self, frame):
+        """frame 전체를 기간별로 한 번에 합산"""
+        rows = np.column_stack([frame.emotions, frame.total, np.ones(len(frame)), frame.char_counts])
+        self._rows = dict(zip(frame.dates, rows))
+        for resolution in self.RESOLUTIONS:
+            keys, inverse = np.unique(_period_keys(resolution, frame.ordinals), return_inverse=True)
+            sums = np.zeros((len(keys), len(ROLLUP_COLUMNS)))
+            np.add.at(sums, inverse, rows)
+            self._sums[resolution] = dict(zip(keys.tolist(), sums))
+        self.version = getattr(frame, 'version', None)
+        self.stale = False
+        self.stats['rebuilds'] += 1
+    
+    def matches(self, frame):
+        if self.stale:
+            return False
+        version = getattr(frame, 'version', None)
+        if version is not None and version == self.version:
+            return True
+        same = len(self._rows) == len(frame) and all(d in self._rows for d in frame.dates)
+        if same and len(frame):
+            rows = np.array([self._rows[d] for d in frame.dates])
+            same = np.array_equal(rows[:, :len(EMOTION_KEYS)], frame.emotions) and np.array_equal(
+                rows[:, len(EMOTION_KEYS)], frame.total
+            )
+        if same:
+            self.version = version
+        return same
+    
+    def _add(self, date_str, row, sign):
+        day = _day_number(date_str)
+        for resolution in self.RESOLUTIONS:
+            key = int(_period_keys(resolution, [day])[0])
+            sums = self._sums[resolution]
+            sums[key] = sums.get(key, np.zeros(len(ROLLUP_COLUMNS))) + sign * row
+            if sums[key][ROLLUP_COLUMNS.index('count')] <= 0:
+                del sums[key]
+    
+    def apply(self, date_str, item_data):
+        self.stats['updates'] += 1
+        old = self._rows.pop(date_str, None)
+        if old is not None:
+            self._add(date_str, old, -1)
+        if item_data is not None:
+            row = self._row(item_data)
+            self._rows[date_str] = row
+            self._add(date_str, row, 1)
+    
+    def series(self, resolution, periods=None):
+        """기간 오름차순 (라벨 목록, 합계 배열 (k, len(ROLLUP_COLUMNS)))"""
+        keys = sorted(self._sums[resolution])
+        if periods:
+            keys = keys[-periods:]
+        sums = np.array([self._sums[resolution][k] for k in keys]).reshape(-1, len(ROLLUP_COLUMNS))
+        return [_period_label(resolution, k) for k in keys], sums
+    
+    def means(self, resolution, periods=None):
+        """기간별 평균 {'joy', ..., 'total'} + 일기 수/글자 수 합계"""
+        labels, sums = self.series(resolution, periods)
+        counts = sums[:, ROLLUP_COLUMNS.index('count')]
+        result = {
+            k: sums[:, i] / counts for i, k in enumerate(EMOTION_KEYS + ['total'])
+        }
+        result['count'] = counts.astype(np.int64)
+        result['chars'] = sums[:, ROLLUP_COLUMNS.index('chars')].astype(np.int64)
+        return labels, result
+
+def get_diary_rollups():
+    """세션의 주별/월별 집계 (저장/삭제는 notify_diary_change로 증분 반영)"""
+    frame = get_diary_frame()
+    listeners = _diary_listeners()
+    rollups = listeners.get('rollups')
+    if rollups is None:
+        rollups = listeners['rollups'] = DiaryRollups()
+        rollups.load(frame)
+    elif not rollups.matches(frame):
+        rollups.load(frame)
+    return rollups
+
+def calc_average_total_score(frame):
+    return round(float(frame.total.mean()), 2) if len(frame) else 0
+
+def calc_char_count(frame):
+    return int(frame.char_counts.sum())
+
+# 키워드 역색인 (키워드 → 날짜, 저장/삭제 시 증분 갱신)
+class KeywordIndex:
+    """
+    키워드별 언급 날짜를 정렬된 목록으로 유지 (한 일기 안의 중복 키워드는 1회)
+    날짜 구간 빈도는 이진 탐색 두 번, TOP K는 힙 → 비용이 일기 수가 아니라 키워드 종류 수에 비례
+    """
+    def __init__(self):
+        self.stale = False
+        self.version = None
+        self._dates = {}  # keyword → 날짜 목록 (오름차순)
+        self._keywords = {}  # date → 키워드 튜플
+        self.stats = {'updates': 0, 'rebuilds': 0}
+    
+    @staticmethod
+    def _normalize(keywords):
+        seen = []
+        for keyword in keywords or []:
+            keyword = str(keyword).strip()
+            if keyword and keyword not in seen:
+                seen.append(keyword)
+        return tuple(seen)
+    
+    def load(self, frame):
+        self._dates = {}
+        self._keywords = {}
+        # frame은 날짜순이므로 append만으로 정렬 유지
+        for item in frame.items:
+            keywords = self._normalize(item['keywords'])
+            self._keywords[item['date']] = keywords
+            for keyword in keywords:
+                self._dates.setdefault(keyword, []).append(item['date'])
+        self.version = getattr(frame, 'version', None)
+        self.stale = False
+        self.stats['rebuilds'] += 1
+    
+    def matches(self, frame):
+        if self.stale:
+            return False
+        version = getattr(frame, 'version', None)
+        if version is not None and version == self.version:
+            return True
+        same = len(self._keywords) == len(frame) and all(
+            self._keywords.get(item['date']) == self._normalize(item['keywords']) for item in frame.items
+        )
+        if same:
+            self.version = version
+        return same
+    
+    def apply(self, date_str, item_data):
+        self.stats['updates'] += 1
+        for keyword in self._keywords.pop(date_str, ()):
+            dates = self._dates[keyword]
+            del dates[bisect.bisect_left(dates, date_str)]
+            if not dates:
+                del self._dates[keyword]
+        if item_data is not None:
+            keywords = self._normalize(item_data['keywords'])
+            self._keywords[date_str] = keywords
+            for keyword in keywords:
+                bisect.insort(self._dates.setdefault(keyword, []), date_str)
+    
+    def count(self, keyword, start=None, end=None):
+        """[start, end] 구간에서 키워드가 나온 일기 수"""
+        dates = self._dates.get(keyword, [])
+        if start is None and end is None:
+            return len(dates)
+        lo = bisect.bisect_left(dates, start) if start else 0
+        hi = bisect.bisect_right(dates, end) if end else len(dates)
+        return max(0, hi - lo)
+    
+    def top_k(self, k=10, start=None, end=None):
+        """구간 내 빈도 상위 k개 [(키워드, 횟수)]"""
+        counts = ((keyword, self.count(keyword, start, end)) for keyword in self._dates)
+        return heapq.nlargest(k, (item for item in counts if item[1] > 0), key=lambda x: x[1])
+    
+    def dates_for(self, keyword, start=None, end=None):
+        """키워드가 나온 날짜 (오름차순)"""
+        dates = self._dates.get(keyword, [])
+        lo = bisect.bisect_left(dates, start) if start else 0
+        hi = bisect.bisect_right(dates, end) if end else len(dates)
+        return dates[lo:hi]
+    
+    def co_occurrence(self, keyword, k=5, start=None, end=None):
+        """같은 일기에 함께 나온 키워드 상위 k개 [(키워드, 횟수)]"""
+        counts = {}
+        for date_str in self.dates_for(keyword, start, end):
+            for other in self._keywords[date_str]:
+                if other != keyword:
+                    counts[other] = counts.get(other, 0) + 1
+        return heapq.nlargest(k, counts.items(), key=lambda x: x[1])
+    
+    def __len__(self):
+        return len(self._dates)
+
+def get_keyword_index():
+    """세션의 키워드 역색인 (저장/삭제는 notify_diary_change로 증분 반영)"""
+    frame = get_diary_frame()
+    listeners = _diary_listeners()
+    index = listeners.get('keywords')
+    if index is None:
+        index = listeners['keywords'] = KeywordIndex()
+        index.load(frame)
+    elif not index.matches(frame):
+        index.load(frame)
+    return index
 
-def get_latest_data():
-    data = load_data_from_sheets()
-    items = sorted(data.values(), key=lambda x: x["date"])[-30:]
-    return data, items
+# 기간 비교 (누적합으로 임의 구간 평균/분산을 O(1)에)
+# 이름 → (라벨, 구간 길이(일), 이전 구간까지 거리(일))
+PERIOD_WINDOWS = {
+    'week': ('최근 1주 vs 이전 1주', 7, 7),
+    'month': ('최근 30일 vs 이전 30일', 30, 30),
+    'quarter': ('최근 3개월 vs 이전 3개월', 91, 91),
+    'yoy': ('최근 30일 vs 작년 같은 기간', 30, 365),
+}
+PERIOD_SIGNIFICANCE_T = 2.0  # |t| 기준 (대략 95%)
 
-def save_expert_advice_to_sheets(date_str, expert_type, advice, has_content):
-    try:
-        all_values = expert_worksheet.get_all_values()
-        row_index = None
-        
-        for idx, row in enumerate(all_values[1:], start=2):
-            if len(row) >= 2 and row[0] == date_str and row[1] == expert_type:
-                row_index = idx
-                break
-        
-        row_data = [str(date_str), str(expert_type), str(advice), str(has_content), datetime.now().isoformat()]
-        
-        if row_index:
-            expert_worksheet.update(f'A{row_index}:E{row_index}', [row_data])
+class PeriodComparator:
+    """
+    감정 5개 + 종합 점수의 누적합/제곱 누적합
+    날짜 구간은 이진 탐색으로 인덱스를 찾고, 평균·분산은 누적합 차로 계산
+    """
+    COLUMNS = EMOTION_KEYS + ['total']
+    
+    def __init__(self, frame):
+        self.frame = frame
+        values = np.column_stack([frame.emotions, frame.total])
+        zeros = np.zeros((1, values.shape[1]))
+        self._sum = np.vstack([zeros, np.cumsum(values, axis=0)])
+        self._sumsq = np.vstack([zeros, np.cumsum(values ** 2, axis=0)])
+    
+    def range_stats(self, start_date, end_date):
+        """[start_date, end_date] 구간 → (n, 평균 배열, 표본분산 배열)"""
+        lo, hi = self.frame.index_range(start_date, end_date)
+        n = hi - lo
+        if n <= 0:
+            return 0, None, None
+        total = self._sum[hi] - self._sum[lo]
+        mean = total / n
+        if n > 1:
+            var = np.clip((self._sumsq[hi] - self._sumsq[lo] - total * mean) / (n - 1), 0, None)
         else:
-            expert_worksheet.append_row(row_data)
+            var = np.zeros_like(mean)
+        return n, mean, var
+    
+    def named_ranges(self, window):
+        """최근 일기 날짜 기준 (현재 구간, 이전 구간)"""
+        _, length, offset = PERIOD_WINDOWS[window]
+        anchor = np.datetime64(int(self.frame.ordinals[-1]), 'D')
+        current = (anchor - (length - 1), anchor)
+        previous = (current[0] - offset, current[1] - offset)
+        return tuple((str(a), str(b)) for a, b in (current, previous))
+    
+    def compare(self, current, previous):
+        """두 날짜 구간 비교 → 항목별 평균/차이/분산/유의성 (한쪽이 비면 None)"""
+        n_cur, mean_cur, var_cur = self.range_stats(*current)
+        n_prev, mean_prev, var_prev = self.range_stats(*previous)
+        if not n_cur or not n_prev:
+            return None
         
-        return True
-    except:
-        return False
-
-def load_expert_advice_from_sheets(date_str):
-    try:
-        records = expert_worksheet.get_all_records()
-        advice_data = {}
-        for record in records:
-            if record.get('date') == date_str:
-                expert_type = record.get('expert_type', '')
-                advice_data[expert_type] = {
-                    'advice': record.get('advice', ''),
-                    'has_content': record.get('has_content', 'False') == 'True',
-                    'created_at': record.get('created_at', '')
-                }
-        return advice_data
-    except:
-        return {}
+        diff = mean_cur - mean_prev
+        # Welch t 통계량 (양쪽 다 2개 이상일 때만 판단)
+        se = np.sqrt(var_cur / n_cur + var_prev / n_prev)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # 분산이 0이면 차이가 있는 쪽 방향으로 무한대
+            t = np.where(se > 0, diff / se, np.where(diff != 0, np.copysign(np.inf, diff), 0.0))
+        testable = n_cur > 1 and n_prev > 1
+        
+        comparison = {}
+        for i, key in enumerate(self.COLUMNS):
+            comparison[key] = {
+                'recent': float(mean_cur[i]),
+                'previous': float(mean_prev[i]),
+                'diff': float(diff[i]),
+                'trend': '상승' if diff[i] > 0.5 else ('하락' if diff[i] < -0.5 else '유지'),
+                'recent_var': float(var_cur[i]),
+                'previous_var': float(var_prev[i]),
+                't': float(t[i]),
+                'significant': bool(testable and abs(t[i]) >= PERIOD_SIGNIFICANCE_T)
+            }
+        comparison['_meta'] = {
+            'current': current, 'previous': previous, 'n_recent': n_cur, 'n_previous': n_prev
+        }
+        return comparison
 
-def calc_average_total_score(items):
-    return round(sum(item["total_score"] for item in items) / len(items), 2) if items else 0
+def get_period_comparator(frame):
+    """frame당 한 번만 누적합 생성"""
+    comparator = getattr(frame, '_comparator', None)
+    if comparator is None:
+        comparator = frame._comparator = PeriodComparator(frame)
+    return comparator
 
-def calc_char_count(items):
-    return sum(len(item["content"]) for item in items)
+def compare_periods(frame, window='week', current=None, previous=None):
+    """
+    이름 붙은 구간(week/month/quarter/yoy) 또는 두 날짜 구간 (시작, 끝) 비교
+    결과: {'joy': {...}, ..., 'total': {...}, '_meta': {...}}, 비교할 일기가 없으면 None
+    """
+    if not len(frame):
+        return None
+    comparator = get_period_comparator(frame)
+    if current is None or previous is None:
+        current, previous = comparator.named_ranges(window)
+    return comparator.compare(current, previous)
 
-def calc_keyword_count(items):
-    keyword_count = {}
-    for item in items:
-        for keyword in item["keywords"]:
-            keyword_count[keyword] = keyword_count.get(keyword, 0) + 1
-    return keyword_count
+# 차트 렌더링 캐시 (같은 데이터면 matplotlib 작업 없이 PNG 재사용)
+CHART_CACHE_MAX_ENTRIES = int(get_config("CHART_CACHE_MAX_ENTRIES", 64))
 
-def compare_periods(items):
-    if len(items) < 14:
-        return None
+class ChartRenderCache:
+    """
+    (차트 종류, 입력 구간 지문) → PNG bytes LRU 캐시 (프로세스 전역)
+    pyplot 전역 상태를 공유하므로 렌더링은 한 번에 하나씩
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.render_lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'render_ms': 0.0}
     
-    recent_week = items[-7:]
-    prev_week = items[-14:-7]
+    @staticmethod
+    def fingerprint(chart_type, frame, *args):
+        """차트에 쓰이는 값(날짜 + 점수, 추가 인자)만으로 지문 생성"""
+        h = hashlib.sha1(chart_type.encode("utf-8"))
+        for array in (frame.ordinals, frame.emotions, frame.total):
+            h.update(np.ascontiguousarray(array).tobytes())
+        for arg in args:
+            # 상관 행렬처럼 frame과 따로 계산된 입력도 지문에 포함
+            h.update(np.ascontiguousarray(arg).tobytes() if isinstance(arg, np.ndarray) else repr(arg).encode("utf-8"))
+        return h.hexdigest()
     
-    def calc_avg(period):
-        return {
-            'joy': sum(i['joy'] for i in period) / len(period),
-            'sadness': sum(i['sadness'] for i in period) / len(period),
-            'anger': sum(i['anger'] for i in period) / len(period),
-            'anxiety': sum(i['anxiety'] for i in period) / len(period),
-            'calmness': sum(i['calmness'] for i in period) / len(period),
-            'total': sum(i['total_score'] for i in period) / len(period)
-        }
+    def get(self, key):
+        with self.lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+            return png
     
-    recent_avg = calc_avg(recent_week)
-    prev_avg = calc_avg(prev_week)
-    
-    comparison = {}
-    for key in recent_avg:
-        diff = recent_avg[key] - prev_avg[key]
-        comparison[key] = {
-            'recent': recent_avg[key],
-            'previous': prev_avg[key],
-            'diff': diff,
-            'trend': '상승' if diff > 0.5 else ('하락' if diff < -0.5 else '유지')
-        }
+    def put(self, key, png, render_ms):
+        with self.lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            self.stats['misses'] += 1
+            self.stats['render_ms'] += render_ms
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
     
-    return comparison
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def get_chart_cache():
+    return ChartRenderCache(CHART_CACHE_MAX_ENTRIES)
 
-def create_emotion_flow_chart(items):
+chart_cache = get_chart_cache()
+
+def memoized_chart(chart_type, window):
+    """최근 window개 항목이 같으면 렌더링을 건너뛰는 데코레이터 (BytesIO 반환 형식 유지)
+    렌더 함수는 최근 window개로 자른 DiaryFrame을 받음"""
+    def decorator(render):
+        @functools.wraps(render)
+        def wrapper(frame, *args):
+            frame = frame.tail(window)
+            key = ChartRenderCache.fingerprint(chart_type, frame, *args)
+            png = chart_cache.get(key)
+            if png is None:
+                with chart_cache.render_lock:
+                    # 기다리는 동안 다른 세션이 같은 차트를 그렸을 수 있음
+                    png = chart_cache.get(key)
+                    if png is None:
+                        started = time.perf_counter()
+                        buf = render(frame, *args)
+                        if buf is None:
+                            return None
+                        png = buf.getvalue()
+                        chart_cache.put(key, png, (time.perf_counter() - started) * 1000)
+            return BytesIO(png)
+        return wrapper
+    return decorator
+
+@memoized_chart("emotion_flow", 14)
+def create_emotion_flow_chart(frame):
     try:
         fig, ax = plt.subplots(figsize=(10, 5))
-        recent_items = items[-14:] if len(items) >= 14 else items
-        dates = [item['date'][-5:] for item in recent_items]
-        
-        emotions = {
-            'Joy': [item['joy'] for item in recent_items],
-            'Sadness': [item['sadness'] for item in recent_items],
-            'Anger': [item['anger'] for item in recent_items],
-            'Anxiety': [item['anxiety'] for item in recent_items],
-            'Calm': [item['calmness'] for item in recent_items]
-        }
+        dates = [d[-5:] for d in frame.dates]
+        
+        emotions = dict(zip(['Joy', 'Sadness', 'Anger', 'Anxiety', 'Calm'], frame.emotions.T))
         
         colors = {'Joy': '#FFD700', 'Sadness': '#4169E1', 'Anger': '#DC143C', 'Anxiety': '#FF8C00', 'Calm': '#32CD32'}
         
@@ -683,29 +2616,22 @@ def create_emotion_flow_chart(items):
     except:
         return None
 
-def create_emotion_network(items):
+@memoized_chart("emotion_network", EMOTION_NETWORK_WINDOW)
+def create_emotion_network(frame, corr=None):
     try:
         fig, ax = plt.subplots(figsize=(8, 6))
-        recent_items = items[-30:] if len(items) >= 30 else items
-        
-        emotions = {
-            'Joy': [item['joy'] for item in recent_items],
-            'Sad': [item['sadness'] for item in recent_items],
-            'Anger': [item['anger'] for item in recent_items],
-            'Anxiety': [item['anxiety'] for item in recent_items],
-            'Calm': [item['calmness'] for item in recent_items]
-        }
+        labels = ['Joy', 'Sad', 'Anger', 'Anxiety', 'Calm']
+        if corr is None:
+            corr = frame.correlation_matrix()
         
         G = nx.Graph()
-        for emotion in emotions.keys():
+        for emotion in labels:
             G.add_node(emotion)
         
-        for i, e1 in enumerate(list(emotions.keys())):
-            for j, e2 in enumerate(list(emotions.keys())):
-                if i < j:
-                    corr = np.corrcoef(emotions[e1], emotions[e2])[0, 1]
-                    if abs(corr) > 0.3:
-                        G.add_edge(e1, e2, weight=abs(corr))
+        # 상관계수 행렬의 위쪽 삼각형에서 |r| > 0.3인 쌍만 연결
+        for i, j in zip(*np.triu_indices(len(labels), k=1)):
+            if abs(corr[i, j]) > 0.3:
+                G.add_edge(labels[i], labels[j], weight=abs(corr[i, j]))
         
         pos = nx.spring_layout(G, k=1.5, iterations=50)
         colors = ['#FFD700', '#4169E1', '#DC143C', '#FF8C00', '#32CD32']
@@ -728,24 +2654,24 @@ def create_emotion_network(items):
     except:
         return None
 
-def create_goal_flowchart(items):
+@memoized_chart("goal_flow", 14)
+def create_goal_flowchart(frame):
     try:
         fig, ax = plt.subplots(figsize=(10, 6))
-        recent_items = items[-14:] if len(items) >= 14 else items
-        dates = [item['date'][-5:] for item in recent_items]
-        scores = [item['total_score'] for item in recent_items]
+        dates = [d[-5:] for d in frame.dates]
+        scores = frame.total
         
         ax.plot(dates, scores, marker='o', color='#1E90FF', linewidth=3, markersize=8, label='Motivation')
         
-        avg_score = sum(scores) / len(scores)
+        avg_score = scores.mean()
         ax.axhline(y=avg_score, color='r', linestyle='--', linewidth=2, alpha=0.7, label=f'Avg: {avg_score:.1f}')
         ax.axhline(y=8, color='g', linestyle='--', linewidth=2, alpha=0.5, label='Target: 8.0')
         
         ax.fill_between(range(len(dates)), scores, avg_score, 
-                        where=[s >= avg_score for s in scores],
+                        where=scores >= avg_score,
                         alpha=0.3, color='green', label='Rising')
         ax.fill_between(range(len(dates)), scores, avg_score,
-                        where=[s < avg_score for s in scores],
+                        where=scores < avg_score,
                         alpha=0.3, color='red', label='Falling')
         
         ax.set_xlabel('Date', fontsize=10)
@@ -765,13 +2691,9 @@ def create_goal_flowchart(items):
     except:
         return None
 
-def create_metaphor_prompt(items):
-    recent_items = items[-7:] if len(items) >= 7 else items
-    emotions_summary = {'joy': 0, 'sadness': 0, 'anger': 0, 'anxiety': 0, 'calmness': 0}
-    
-    for item in recent_items:
-        for emotion in emotions_summary:
-            emotions_summary[emotion] += item[emotion]
+def create_metaphor_prompt(frame):
+    sums = frame.tail(7).emotions.sum(axis=0)
+    emotions_summary = {k: int(v) for k, v in zip(EMOTION_KEYS, sums)}
     
     dominant_emotion = max(emotions_summary, key=emotions_summary.get)
     
@@ -785,69 +2707,867 @@ def create_metaphor_prompt(items):
     
     return f"{metaphors[dominant_emotion]}", dominant_emotion, emotions_summary
 
-def gemini_chat(prompt):
+# Gemini 호출 실행기 (스레드 풀)
+LLM_MAX_CONCURRENCY = int(get_config("LLM_MAX_CONCURRENCY", 4))
+EXPERT_BATCH_MODE = get_config("EXPERT_BATCH_MODE", "concurrent").strip().lower()  # concurrent | single
+LLM_TIMEOUT = float(get_config("LLM_TIMEOUT", 30))  # 호출당 제한 시간(초)
+LLM_QUEUE_MARGIN = float(get_config("LLM_QUEUE_MARGIN", 10))  # 공유 풀 대기 여유(초)
+
+@st.cache_resource
+def get_llm_executor():
+    """LLM 호출 전용 스레드 풀 (프로세스 전역, 동시 호출 수 제한)"""
+    return ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+def submit_llm_task(fn, *args, **kwargs):
+    """
+    LLM 작업을 백그라운드로 제출하고 Future 반환
+    작업 함수 안에서는 st.* 를 호출하지 않아야 함 (스크립트 스레드 밖에서 실행됨)
+    """
+    future = get_llm_executor().submit(fn, *args, **kwargs)
+    st.session_state.setdefault('_llm_futures', []).append((RERUN_ID, future))
+    return future
+
+def llm_task_timeout(call_timeout=None):
+    """gemini_json 작업 하나를 기다리는 시간 (재요청까지 포함한 전체 제한 + 풀 대기 여유)"""
+    return (call_timeout or LLM_TIMEOUT) * (LLM_JSON_RETRIES + 1) + LLM_QUEUE_MARGIN
+
+def wait_llm_task(future, default=None, timeout=None):
+    """작업 결과 대기 (시간 초과/실패 시 취소하고 기본값 반환)"""
+    try:
+        return future.result(timeout=timeout or llm_task_timeout())
+    except Exception:
+        future.cancel()
+        return default
+
+def cancel_stale_llm_tasks():
+    """이전 실행(rerun)에서 제출된 작업 취소 - 사용자가 다른 화면으로 이동하면 결과가 필요 없음"""
+    futures = st.session_state.get('_llm_futures', [])
+    for run_id, future in futures:
+        if run_id != RERUN_ID:
+            future.cancel()
+    st.session_state._llm_futures = [(run_id, f) for run_id, f in futures if run_id == RERUN_ID and not f.done()]
+
+def gemini_chat(prompt, timeout=None, target_model=None):
+    """target_model: 컨텍스트 캐시를 쓰는 모델 (없으면 기본 모델)"""
     try:
-        response = model.generate_content(prompt)
+        response = (target_model or model).generate_content(prompt, request_options={"timeout": timeout or LLM_TIMEOUT})
         return response.text
     except:
         return None
 
-def sentiment_analysis(content):
-    prompt = f"""
+SENTIMENT_FALLBACK = {"keywords": ["일기", "오늘", "하루", "생각", "마음"], "joy": 5, "sadness": 3, "anger": 2, "anxiety": 3, "calmness": 4}
+MESSAGE_FALLBACK = "오늘도 일기를 써주셔서 감사해요! 😊"
+ADVICE_FALLBACK = {"advice": "조언을 생성할 수 없습니다.", "has_content": False}
+
+# 구조화된 JSON 응답 (response_schema 요청 → 검증 → 로컬 복구 → 제한된 재요청)
+LLM_JSON_MODE = get_config_flag("LLM_JSON_MODE", True)  # 모델의 JSON 출력 모드 사용
+LLM_JSON_RETRIES = int(get_config("LLM_JSON_RETRIES", 1))  # 복구도 안 될 때 다시 요청하는 횟수
+
+_EMOTION_SCHEMA = {"type": "integer"}
+RESPONSE_SCHEMAS = {
+    'sentiment': {
+        "type": "object",
+        "properties": {
+            "keywords": {"type": "array", "items": {"type": "string"}},
+            **{k: _EMOTION_SCHEMA for k in ['joy', 'sadness', 'anger', 'anxiety', 'calmness']}
+        },
+        "required": ["keywords", "joy", "sadness", "anger", "anxiety", "calmness"]
+    },
+    'sentiment_batch': {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "keywords": {"type": "array", "items": {"type": "string"}},
+                        **{k: _EMOTION_SCHEMA for k in ['joy', 'sadness', 'anger', 'anxiety', 'calmness']}
+                    },
+                    "required": ["id", "keywords", "joy", "sadness", "anger", "anxiety", "calmness"]
+                }
+            }
+        },
+        "required": ["results"]
+    },
+    'message': {
+        "type": "object",
+        "properties": {"message": {"type": "string"}},
+        "required": ["message"]
+    },
+    'advice': {
+        "type": "object",
+        "properties": {"advice": {"type": "string"}, "has_content": {"type": "boolean"}},
+        "required": ["advice", "has_content"]
+    },
+    'multi_advice': {
+        "type": "object",
+        "properties": {
+            "experts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "expert_type": {"type": "string"},
+                        "advice": {"type": "string"},
+                        "has_content": {"type": "boolean"}
+                    },
+                    "required": ["expert_type", "advice", "has_content"]
+                }
+            }
+        },
+        "required": ["experts"]
+    }
+}
+# 스키마로 표현하지 않는 값 범위 (검증 시 잘라냄)
+RESPONSE_RANGES = {'sentiment': {k: (0, 10) for k in ['joy', 'sadness', 'anger', 'anxiety', 'calmness']}}
+
+class LLMJsonStats:
+    """호출 종류별 JSON 응답 카운터 (프로세스 전역)"""
+    FIELDS = ('calls', 'ok', 'repaired', 'retries', 'parse_failures', 'failed', 'call_errors')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_kind = {}
+        self.json_mode_unsupported = set()  # JSON 모드를 거부한 모델 이름
+        self.batch = {'requests': 0, 'entries': 0, 'splits': 0, 'fallbacks': 0}
+    
+    def incr(self, kind, field):
+        with self.lock:
+            counters = self.by_kind.setdefault(kind, dict.fromkeys(self.FIELDS, 0))
+            counters[field] += 1
+    
+    def incr_batch(self, field, amount=1):
+        with self.lock:
+            self.batch[field] += amount
+
+@st.cache_resource
+def get_llm_json_stats():
+    return LLMJsonStats()
+
+llm_json_stats = get_llm_json_stats()
+
+def _validate_json(value, schema):
+    """스키마에 맞게 값 변환 (정수/불리언/문자열 보정), 맞지 않으면 ValueError"""
+    kind = schema["type"]
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise ValueError("객체가 아님")
+        missing = [k for k in schema.get("required", []) if k not in value]
+        if missing:
+            raise ValueError(f"필드 누락: {', '.join(missing)}")
+        return {k: _validate_json(value[k], sub) for k, sub in schema["properties"].items() if k in value}
+    if kind == "array":
+        if not isinstance(value, list):
+            raise ValueError("배열이 아님")
+        return [_validate_json(v, schema["items"]) for v in value]
+    if kind == "integer":
+        if isinstance(value, bool):
+            raise ValueError("정수가 아님")
+        number = float(value)
+        if not math.isfinite(number):  # json.loads는 Infinity, NaN, 1e400도 받아들임
+            raise ValueError("유한한 수가 아님")
+        return int(round(number))
+    if kind == "boolean":
+        if isinstance(value, str):
+            if value.strip().lower() not in ("true", "false"):
+                raise ValueError("불리언이 아님")
+            return value.strip().lower() == "true"
+        return bool(value)
+    if value is None or isinstance(value, (dict, list)):
+        raise ValueError("문자열이 아님")
+    return str(value)
+
+def _json_candidates(text):
+    """응답 텍스트 → 파싱해 볼 후보 (원문, 코드 블록 제거, 중괄호 구간, 끝 쉼표 제거)"""
+    text = text.strip()
+    yield text, False
+    fenced = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    start, end = fenced.find('{'), fenced.rfind('}') + 1
+    sliced = fenced[start:end] if start >= 0 and end > start else fenced
+    yield sliced, True
+    yield re.sub(r",\s*([}\]])", r"\1", sliced), True
+
+def parse_json_response(text, kind):
+    """응답 텍스트 → (검증된 값, 복구 여부, 오류 메시지)"""
+    schema = RESPONSE_SCHEMAS[kind]
+    error = "JSON 아님"
+    for candidate, repaired in _json_candidates(text):
+        try:
+            value = _validate_json(json.loads(candidate), schema)
+        except (ValueError, TypeError, OverflowError) as e:  # json.JSONDecodeError 포함
+            error = str(e)
+            continue
+        for key, (low, high) in RESPONSE_RANGES.get(kind, {}).items():
+            value[key] = min(high, max(low, value[key]))
+        return value, repaired, None
+    return None, False, error
+
+def _generate_json_text(kind, prompt, timeout, target_model):
+    """JSON 모드로 요청 (모델이 거부하면 그 모델은 일반 모드로 전환, 남은 시간 안에서만)"""
+    target = target_model or model
+    target_name = getattr(target, 'model_name', model_name)
+    started = time.monotonic()
+    if LLM_JSON_MODE and target_name not in llm_json_stats.json_mode_unsupported:
+        try:
+            response = target.generate_content(
+                prompt,
+                generation_config={"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMAS[kind]},
+                request_options={"timeout": timeout}
+            )
+            return response.text
+        except Exception as e:
+            message = str(e)
+            if not any(hint in message for hint in ("response_mime_type", "response_schema", "JSON mode")):
+                return None
+            llm_json_stats.json_mode_unsupported.add(target_name)
+    remaining = timeout - (time.monotonic() - started)
+    if remaining < 1:
+        return None
+    return gemini_chat(prompt, timeout=remaining, target_model=target_model)
+
+def gemini_json(kind, prompt, timeout=None, target_model=None):
+    """
+    구조화된 JSON 호출 → 스키마 검증을 통과한 값, 실패 시 None
+    timeout은 호출당 제한이고, 재요청까지 합친 전체는 llm_task_timeout()의 대기 시간 안에 끝남
+    작업 스레드에서 호출됨 (st 사용 금지)
+    """
+    return gemini_json_with_reason(kind, prompt, timeout, target_model)[0]
+
+def gemini_json_with_reason(kind, prompt, timeout=None, target_model=None):
+    """
+    gemini_json과 같지만 (값, 실패 원인) 반환
+    실패 원인: None(성공), 'call'(네트워크/시간 초과), 'parse'(응답을 스키마에 맞게 읽지 못함 - 출력 잘림 등)
+    """
+    llm_json_stats.incr(kind, 'calls')
+    call_timeout = timeout or LLM_TIMEOUT
+    deadline = time.monotonic() + call_timeout * (LLM_JSON_RETRIES + 1)
+    attempt_prompt = prompt
+    for attempt in range(LLM_JSON_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining < 1:
+            break
+        if attempt:
+            llm_json_stats.incr(kind, 'retries')
+        text = _generate_json_text(kind, attempt_prompt, min(call_timeout, remaining), target_model)
+        if text is None:
+            # 네트워크/시간 초과는 다시 요청해도 같은 결과일 가능성이 큼
+            llm_json_stats.incr(kind, 'call_errors')
+            return None, 'call'
+        value, repaired, error = parse_json_response(text, kind)
+        if value is not None:
+            llm_json_stats.incr(kind, 'repaired' if repaired else 'ok')
+            return value, None
+        llm_json_stats.incr(kind, 'parse_failures')
+        attempt_prompt = f"{prompt}\n\n이전 응답을 JSON으로 읽을 수 없었습니다 ({error}). 요청한 형식의 JSON만 다시 답변하세요."
+    llm_json_stats.incr(kind, 'failed')
+    return None, 'parse'
+
+# 감정 분석 결과 캐시 (내용 해시 + 모델 이름 → 분석 JSON)
+SENTIMENT_CACHE_ENABLED = get_config_flag("SENTIMENT_CACHE", True)
+SENTIMENT_CACHE_PATH = get_config("SENTIMENT_CACHE_PATH", os.path.join(LOCAL_DATA_DIR, "sentiment_cache.sqlite3"))
+SENTIMENT_CACHE_MAX_ENTRIES = int(get_config("SENTIMENT_CACHE_MAX_ENTRIES", 5000))
+
+class SentimentCache:
+    """SQLite 기반 영구 LRU 캐시 (최근 사용 시각 기준으로 오래된 항목부터 제거)"""
+    def __init__(self, path, max_entries):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sentiment_cache (key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sentiment_last_used ON sentiment_cache (last_used)")
+        self.conn.commit()
+        self._size = self.conn.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0]
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    @staticmethod
+    def make_key(content, model_name, prompt_version):
+        """prompt_version: 프롬프트가 다르면(단건/묶음, 프롬프트 수정) 다른 결과로 취급"""
+        normalized = " ".join(unicodedata.normalize("NFC", content).split())
+        return hashlib.sha256(f"{model_name}\0{prompt_version}\0{normalized}".encode("utf-8")).hexdigest()
+    
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM sentiment_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.conn.execute("UPDATE sentiment_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.stats['hits'] += 1
+            return json.loads(row[0])
+    
+    def put(self, key, result):
+        with self.lock:
+            existed = self.conn.execute("SELECT 1 FROM sentiment_cache WHERE key = ?", (key,)).fetchone() is not None
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sentiment_cache (key, result, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            if not existed:
+                self._size += 1
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self.conn.execute(
+                    "DELETE FROM sentiment_cache WHERE key IN (SELECT key FROM sentiment_cache ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+                self.stats['evictions'] += overflow
+            self.conn.commit()
+    
+    def __len__(self):
+        return self._size
+
+@st.cache_resource
+def get_sentiment_cache():
+    try:
+        return SentimentCache(SENTIMENT_CACHE_PATH, SENTIMENT_CACHE_MAX_ENTRIES)
+    except Exception:
+        return None
+
+# 작업 스레드에서도 쓰므로 스크립트 스레드에서 미리 꺼내둠
+sentiment_cache = get_sentiment_cache() if SENTIMENT_CACHE_ENABLED else None
+
+def prompt_version(template, kind):
+    """프롬프트 틀 + 응답 스키마 → 감정 분석 캐시 키에 넣는 버전 (프롬프트를 고치면 이전 결과를 쓰지 않음)"""
+    source = template + json.dumps(RESPONSE_SCHEMAS[kind], sort_keys=True)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+SENTIMENT_PROMPT = """
     일기 감정 분석. JSON으로 답변:
     {content}
     형식: {{"keywords": ["k1", "k2", "k3", "k4", "k5"], "joy": 0-10, "sadness": 0-10, "anger": 0-10, "anxiety": 0-10, "calmness": 0-10}}
     """
-    try:
-        response_text = gemini_chat(prompt)
-        if response_text:
-            start = response_text.find('{')
-            end = response_text.rfind('}') + 1
-            if start >= 0 and end > start:
-                return json.loads(response_text[start:end])
-    except:
-        pass
-    return {"keywords": ["일기", "오늘", "하루", "생각", "마음"], "joy": 5, "sadness": 3, "anger": 2, "anxiety": 3, "calmness": 4}
+SENTIMENT_PROMPT_VERSION = prompt_version(SENTIMENT_PROMPT, 'sentiment')
+
+def sentiment_analysis(content, fallback=True, use_cache=True):
+    """
+    fallback=False: 분석 실패 시 기본값 대신 None 반환 (가져오기에서 실패 항목 구분용)
+    use_cache=False: 캐시를 읽지 않고 다시 분석 (결과는 캐시에 덮어씀)
+    """
+    cache_key = None
+    if sentiment_cache is not None:
+        cache_key = SentimentCache.make_key(content, model_name, SENTIMENT_PROMPT_VERSION)
+        cached = sentiment_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
+    
+    analyzed = gemini_json('sentiment', SENTIMENT_PROMPT.format(content=content))
+    if analyzed is None:
+        return dict(SENTIMENT_FALLBACK) if fallback else None
+    if cache_key:
+        sentiment_cache.put(cache_key, analyzed)
+    return analyzed
+
+# 여러 일기를 한 요청으로 감정 분석
+SENTIMENT_BATCH_MAX_TOKENS = int(get_config("SENTIMENT_BATCH_MAX_TOKENS", 6000))  # 요청당 입력 토큰 추정 상한
+SENTIMENT_BATCH_MAX_ENTRIES = int(get_config("SENTIMENT_BATCH_MAX_ENTRIES", 25))  # 요청당 일기 수 (출력 길이 제한)
+SENTIMENT_BATCH_PROMPT = """
+    여러 일기 감정 분석. 각 일기의 id를 그대로 사용해 JSON으로 답변:
+    {entries}
+    형식: {{"results": [{{"id": 0, "keywords": ["k1", "k2", "k3", "k4", "k5"], "joy": 0-10, "sadness": 0-10, "anger": 0-10, "anxiety": 0-10, "calmness": 0-10}}]}}
+    """
+SENTIMENT_BATCH_PROMPT_VERSION = prompt_version(SENTIMENT_BATCH_PROMPT, 'sentiment_batch')
+
+def pack_sentiment_batches(entries, max_tokens=None, max_entries=None):
+    """[(id, 내용)] → 토큰/개수 상한을 넘지 않는 묶음 목록 (순서 유지)"""
+    max_tokens = max_tokens or SENTIMENT_BATCH_MAX_TOKENS
+    max_entries = max_entries or SENTIMENT_BATCH_MAX_ENTRIES
+    overhead = estimate_tokens(SENTIMENT_BATCH_PROMPT)
+    groups, group, used = [], [], overhead
+    for entry_id, content in entries:
+        tokens = estimate_tokens(content) + 8  # id 표시
+        if group and (used + tokens > max_tokens or len(group) >= max_entries):
+            groups.append(group)
+            group, used = [], overhead
+        group.append((entry_id, content))
+        used += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+def _analyze_sentiment_group(group, before_request=None, use_cache=True):
+    """
+    묶음 하나 분석 → {id: 결과}
+    응답을 읽지 못하면 반으로 나눠 다시 시도하고, 응답에서 빠진 일기만 한 건씩 분석
+    네트워크/시간 초과는 나눠도 같은 결과라 묶음 전체를 바로 실패(None) 처리
+    묶음 응답 결과만 묶음 프롬프트 버전으로 캐시 (한 건씩 분석한 결과는 sentiment_analysis가 캐시)
+    """
+    if len(group) == 1:
+        entry_id, content = group[0]
+        llm_json_stats.incr_batch('fallbacks')
+        if before_request:
+            before_request()
+        return {entry_id: sentiment_analysis(content, fallback=False, use_cache=use_cache)}
+    
+    if before_request:
+        before_request()
+    llm_json_stats.incr_batch('requests')
+    llm_json_stats.incr_batch('entries', len(group))
+    entries_text = "\n".join(f"[id={entry_id}]\n{content}" for entry_id, content in group)
+    parsed, failure = gemini_json_with_reason('sentiment_batch', SENTIMENT_BATCH_PROMPT.format(entries=entries_text))
+    if failure == 'call':
+        return {entry_id: None for entry_id, _ in group}
+    if parsed is None:
+        # 출력이 잘렸거나 형식이 깨진 경우가 많아 작게 나눠 재시도
+        llm_json_stats.incr_batch('splits')
+        middle = len(group) // 2
+        results = _analyze_sentiment_group(group[:middle], before_request, use_cache)
+        results.update(_analyze_sentiment_group(group[middle:], before_request, use_cache))
+        return results
+    
+    contents = dict(group)
+    results = {}
+    for result in parsed["results"]:
+        if result["id"] in contents and result["id"] not in results:
+            analyzed = {k: min(10, max(0, result[k])) for k in SENTIMENT_FALLBACK if k != "keywords"}
+            analyzed["keywords"] = result["keywords"]
+            results[result["id"]] = analyzed
+            if sentiment_cache is not None:
+                key = SentimentCache.make_key(contents[result["id"]], model_name, SENTIMENT_BATCH_PROMPT_VERSION)
+                sentiment_cache.put(key, analyzed)
+    for entry_id, content in group:
+        if entry_id not in results:
+            results.update(_analyze_sentiment_group([(entry_id, content)], before_request, use_cache))
+    return results
+
+def sentiment_analysis_batch(contents, before_request=None, use_cache=True):
+    """
+    여러 일기 감정 분석 → 입력 순서대로 결과 목록 (실패한 항목은 None)
+    캐시에 있는 일기는 건너뛰고, 나머지를 토큰 상한에 맞춰 묶어 요청
+    before_request: 요청 직전 호출 (가져오기의 속도 제한 등)
+    use_cache=False: 캐시를 읽지 않고 모두 다시 분석 (재채점용, 결과는 캐시에 덮어씀)
+    """
+    results = [None] * len(contents)
+    pending = []
+    for i, content in enumerate(contents):
+        if use_cache and sentiment_cache is not None:
+            cached = sentiment_cache.get(SentimentCache.make_key(content, model_name, SENTIMENT_BATCH_PROMPT_VERSION))
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append((i, content))
+    
+    for group in pack_sentiment_batches(pending):
+        for i, analyzed in _analyze_sentiment_group(group, before_request, use_cache).items():
+            results[i] = analyzed
+    return results
 
 def generate_message(today_data, recent_data):
     prompt = f"일기 앱 AI. 따뜻한 메시지 JSON: 오늘:{today_data} 최근:{recent_data} 형식: {{\"message\": \"응원 😊\"}}"
-    try:
-        response_text = gemini_chat(prompt)
-        if response_text:
-            start = response_text.find('{')
-            end = response_text.rfind('}') + 1
-            if start >= 0 and end > start:
-                return json.loads(response_text[start:end])["message"]
-    except:
-        pass
-    return "오늘도 일기를 써주셔서 감사해요! 😊"
+    result = gemini_json('message', prompt)
+    return result["message"] if result else MESSAGE_FALLBACK
 
-def get_expert_advice(expert_type, diary_data):
+# 전문가 프롬프트 공통 부분(일기 요약) 캐시
+GEMINI_CONTEXT_CACHE = get_config_flag("GEMINI_CONTEXT_CACHE", True)  # Gemini 컨텍스트 캐싱 사용
+GEMINI_CONTEXT_CACHE_TTL = int(get_config("GEMINI_CONTEXT_CACHE_TTL", 3600))
+GEMINI_CONTEXT_CACHE_RETRY = float(get_config("GEMINI_CONTEXT_CACHE_RETRY", 60))  # 일시적 실패 후 재시도 대기(초)
+GEMINI_CONTEXT_CACHE_UNSUPPORTED_HINTS = ("not supported", "does not support", "unsupported")
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(get_config("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024))  # 모델 최소 캐시 크기 (Flash 1024, Pro 4096 - 부족하면 생성 실패로 기록)
+
+def build_diary_summary(diary_data):
+    """최근 30개 일기 요약 (전문가 프롬프트 공통 부분)"""
     sorted_diaries = sorted(diary_data.values(), key=lambda x: x['date'])
     recent_diaries = sorted_diaries[-30:]
     diary_summary = [f"날짜: {d['date']}, 내용: {d['content'][:100]}..., 점수: {d['total_score']}" for d in recent_diaries]
-    diary_text = "\n".join(diary_summary)
+    return "\n".join(diary_summary)
+
+def estimate_tokens(text):
+    """대략적인 토큰 수 (영문/숫자 약 4자당 1토큰, 한글 등은 글자당 1토큰)"""
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+@st.cache_resource
+def get_gemini_context_caches():
+    """모델 이름 → 가장 최근 요약의 Gemini 캐시 (프로세스 전역, 모델당 하나만 유지)"""
+    return {'lock': threading.Lock(), 'by_model': {}}
+
+def _delete_cached_content(cached):
+    try:
+        cached.delete()
+    except Exception:
+        pass  # 지우지 못해도 서버 TTL이 지나면 만료됨
+
+def get_gemini_cached_model(prefix, tokens):
+    """
+    요약 부분을 Gemini 컨텍스트 캐시에 올리고 그 캐시를 쓰는 모델 반환
+    요약이 바뀌면 이전 캐시는 삭제 (서버 저장 공간도 과금되므로 모델당 하나만 유지)
+    지원하지 않는 모델이거나 최소 크기 미만이면 None (전체 프롬프트 전송)
+    실패는 모델이 캐싱을 지원하지 않을 때만 TTL 동안 기억하고, 그 밖에는 잠시 뒤나 요약이 바뀌면 다시 시도
+    """
+    if not GEMINI_CONTEXT_CACHE or tokens < GEMINI_CONTEXT_CACHE_MIN_TOKENS or not hasattr(genai, 'caching'):
+        return None
+    caches = get_gemini_context_caches()
+    prefix_hash = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+    with caches['lock']:
+        entry = caches['by_model'].get(model_name)
+        if entry and time.time() < entry['expires_at']:
+            if entry['error']:
+                if entry['unsupported'] or entry['hash'] == prefix_hash:
+                    return None
+            elif entry['hash'] == prefix_hash:
+                return entry['model']
+        try:
+            cached = genai.caching.CachedContent.create(
+                model=f"models/{model_name}", display_name="emotion-diary-summary",
+                contents=[prefix], ttl=GEMINI_CONTEXT_CACHE_TTL
+            )
+            # 만료 직전 요청이 실패하지 않도록 조금 일찍 갱신
+            new_entry = {
+                'hash': prefix_hash, 'content': cached, 'error': None, 'unsupported': False,
+                'model': genai.GenerativeModel.from_cached_content(cached_content=cached),
+                'expires_at': time.time() + GEMINI_CONTEXT_CACHE_TTL - 60
+            }
+        except Exception as e:
+            # 429/5xx, 최소 크기 미달 등은 일시적이거나 요약에 따라 달라짐
+            unsupported = any(hint in str(e).lower() for hint in GEMINI_CONTEXT_CACHE_UNSUPPORTED_HINTS)
+            new_entry = {
+                'hash': prefix_hash, 'content': None, 'model': None, 'error': str(e), 'unsupported': unsupported,
+                'expires_at': time.time() + (GEMINI_CONTEXT_CACHE_TTL if unsupported else GEMINI_CONTEXT_CACHE_RETRY)
+            }
+        if entry and entry.get('content') is not None:
+            http_executor.submit(_delete_cached_content, entry['content'])
+        caches['by_model'][model_name] = new_entry
+        return new_entry['model']
+
+def _prompt_context_stats():
+    if '_prompt_context_stats' not in st.session_state:
+        st.session_state._prompt_context_stats = {'hits': 0, 'builds': 0}
+    return st.session_state._prompt_context_stats
+
+def get_expert_context(diary_data):
+    """
+    스냅샷 버전별 전문가 프롬프트 공통 부분
+    {'version', 'prefix', 'tokens', 'cached_model'} - 저장/삭제로 스냅샷이 바뀔 때만 다시 만듦
+    """
+    stats = _prompt_context_stats()
+    snapshot = st.session_state.get('_diary_snapshot')
+    version = snapshot['version'] if snapshot else None
+    context = st.session_state.get('_prompt_context')
+    if context is not None and version is not None and context['version'] == version:
+        stats['hits'] += 1
+    else:
+        stats['builds'] += 1
+        prefix = f"[최근 일기 기록]\n{build_diary_summary(diary_data)}"
+        context = {'version': version, 'prefix': prefix, 'tokens': estimate_tokens(prefix)}
+        st.session_state._prompt_context = context
+    # 캐시 모델은 프로세스 전역이므로 매번 조회 (만료 시 재생성)
+    context['cached_model'] = get_gemini_cached_model(context['prefix'], context['tokens'])
+    return context
+
+def expert_suffix(expert_type):
+    return f"당신은 {expert_type}입니다. 위 일기를 분석하여 JSON으로: {{\"advice\": \"조언\", \"has_content\": true/false}}"
+
+def multi_expert_suffix(expert_types):
+    experts_text = ", ".join(expert_types)
+    return (
+        f"당신은 다음 전문가들입니다: {experts_text}.\n"
+        f"각 전문가의 입장에서 위 일기를 따로 분석하여 JSON으로: "
+        f"{{\"experts\": [{{\"expert_type\": \"전문가 이름\", \"advice\": \"조언\", \"has_content\": true/false}}]}}\n"
+        f"전문가 이름은 다음 그대로 사용: {experts_text}"
+    )
+
+def build_llm_request(context, suffix):
+    """
+    (프롬프트, 모델) - 캐시된 모델이 있으면 전문가별 부분만 전송
+    공통 부분을 앞에 두어 암묵적 prefix 캐싱을 지원하는 모델에서도 재사용되도록 함
+    """
+    if context.get('cached_model') is not None:
+        return suffix, context['cached_model']
+    return f"{context['prefix']}\n\n{suffix}", None
+
+def request_expert_advice(prompt, target_model=None):
+    return gemini_json('advice', prompt, target_model=target_model) or dict(ADVICE_FALLBACK)
+
+def request_multi_expert_advice(prompt, expert_types, target_model=None):
+    """한 번의 호출로 여러 전문가 조언 → {expert_type: 결과} (빠진 전문가는 기본값)"""
+    results = {}
+    parsed = gemini_json('multi_advice', prompt, timeout=LLM_TIMEOUT * 2, target_model=target_model)
+    for result in (parsed or {}).get("experts", []):
+        if result['expert_type'] in expert_types:
+            results[result['expert_type']] = {"advice": result["advice"], "has_content": result["has_content"]}
+    return {expert_type: results.get(expert_type, dict(ADVICE_FALLBACK)) for expert_type in expert_types}
+
+def stream_expert_advice_batch(expert_types, diary_data, on_result, mode=None):
+    """
+    여러 전문가 조언을 한 번에 생성
+    concurrent: 전문가별 호출을 동시에 보내고 끝나는 순서대로 on_result(expert_type, 결과) 호출
+    single: 여러 역할을 한 프롬프트로 요청
+    요약은 스냅샷 버전별로 한 번만 만들고, 결과 전체를 {expert_type: 결과}로 반환
+    """
+    mode = mode or EXPERT_BATCH_MODE
+    context = get_expert_context(diary_data)
+    results = {}
     
-    prompt = f"당신은 {expert_type}입니다.\n{diary_text}\n\n분석하여 JSON으로: {{\"advice\": \"조언\", \"has_content\": true/false}}"
+    if mode == "single":
+        prompt, target_model = build_llm_request(context, multi_expert_suffix(expert_types))
+        future = submit_llm_task(request_multi_expert_advice, prompt, expert_types, target_model)
+        fallback = {expert_type: dict(ADVICE_FALLBACK) for expert_type in expert_types}
+        for expert_type, result in wait_llm_task(future, default=fallback, timeout=llm_task_timeout(LLM_TIMEOUT * 2)).items():
+            results[expert_type] = result
+            on_result(expert_type, result)
+        return results
     
-    try:
-        with st.spinner(f'🤖 {expert_type} 분석 중...'):
-            response_text = gemini_chat(prompt)
-            if response_text:
-                start = response_text.find('{')
-                end = response_text.rfind('}') + 1
-                if start >= 0 and end > start:
-                    return json.loads(response_text[start:end])
-    except:
-        pass
-    return {"advice": "조언을 생성할 수 없습니다.", "has_content": False}
+    pending = {
+        submit_llm_task(request_expert_advice, *build_llm_request(context, expert_suffix(expert_type))): expert_type
+        for expert_type in expert_types
+    }
+    # 풀 크기만큼씩 실행되므로 제한 시간도 그만큼 늘림
+    deadline = time.monotonic() + llm_task_timeout() * -(-len(expert_types) // LLM_MAX_CONCURRENCY)
+    while pending:
+        done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            expert_type = pending.pop(future)
+            results[expert_type] = wait_llm_task(future, default=dict(ADVICE_FALLBACK))
+            on_result(expert_type, results[expert_type])
+    # 제한 시간 안에 끝나지 않은 전문가
+    for future, expert_type in pending.items():
+        future.cancel()
+        results[expert_type] = dict(ADVICE_FALLBACK)
+        on_result(expert_type, results[expert_type])
+    return results
 
 def calc_total_score(item):
     score = (2 * item["joy"] + 1.5 * item["calmness"] - 2 * item["sadness"] - 1.5 * item["anxiety"] - 1.5 * item["anger"] + 50)
     return round(score / 8.5, 2)
 
+# 과거 일기 가져오기 (JSONL/CSV)
+IMPORT_RATE_LIMIT = float(get_config("IMPORT_RATE_LIMIT", 60))  # 분당 Gemini 요청 수
+IMPORT_BATCH_SIZE = int(get_config("IMPORT_BATCH_SIZE", 100))  # 한 번에 읽어 분석하는 일기 수 (SENTIMENT_BATCH_MAX_ENTRIES씩 동시 요청)
+IMPORT_WRITE_CHUNK = int(get_config("IMPORT_WRITE_CHUNK", 200))  # 한 번에 저장하는 행 수
+IMPORT_MAX_CONCURRENCY = int(get_config("IMPORT_MAX_CONCURRENCY", 2))  # 동시에 보내는 묶음 분석 요청 수
+IMPORT_CHECKPOINT_DIR = get_config("IMPORT_CHECKPOINT_DIR", os.path.join(LOCAL_DATA_DIR, "import_checkpoints"))
+IMPORT_DATE_FORMATS = ("%Y-%m-%d", "%Y.%m.%d", "%Y/%m/%d", "%Y%m%d")
+
+class RateLimiter:
+    """토큰 버킷 - acquire()는 허용될 때까지 대기 (여러 스레드 공유)"""
+    def __init__(self, per_minute, burst=None):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.capacity = burst or max(1, int(per_minute // 60) or 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        if not self.interval:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) * self.interval
+            time.sleep(wait_for)
+
+def normalize_import_date(value):
+    value = str(value or "").strip()[:10]
+    for fmt in IMPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+def iter_import_records(uploaded_file, file_format):
+    """
+    업로드 파일 → {'date', 'content', ...} 레코드를 차례로 반환
+    CSV/JSONL은 한 줄씩 읽고, JSON은 배열 전체를 읽음 (배열이 아니면 JSONL로 간주)
+    객체가 아닌 레코드나 깨진 줄은 {}로 돌려 건너뛴 것으로 집계
+    """
+    uploaded_file.seek(0)
+    text = TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "csv":
+            for record in csv.DictReader(text):
+                yield record
+            return
+        lines = text
+        if file_format == "json":
+            raw = text.read()
+            try:
+                records = json.loads(raw)
+            except ValueError:
+                records = None  # 확장자만 .json인 JSONL
+            if records is not None:
+                for record in records if isinstance(records, list) else [records]:
+                    yield record if isinstance(record, dict) else {}
+                return
+            lines = raw.splitlines()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else {}
+    finally:
+        text.detach()
+
+def file_fingerprint(uploaded_file):
+    h = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+        h.update(chunk)
+    uploaded_file.seek(0)
+    return h.hexdigest()
+
+def load_import_checkpoint(fingerprint):
+    try:
+        with open(os.path.join(IMPORT_CHECKPOINT_DIR, f"{fingerprint}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_import_checkpoint(fingerprint, checkpoint):
+    os.makedirs(IMPORT_CHECKPOINT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_CHECKPOINT_DIR, f"{fingerprint}.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+def _import_item(record, analyzed):
+    item = {
+        "content": str(record["content"]),
+        "keywords": analyzed["keywords"],
+        "joy": analyzed["joy"], "sadness": analyzed["sadness"], "anger": analyzed["anger"],
+        "anxiety": analyzed["anxiety"], "calmness": analyzed["calmness"],
+        "message": str(record.get("message") or "📥 가져온 일기")
+    }
+    item["total_score"] = calc_total_score(item)
+    return item
+
+def _prescored(record):
+    """
+    내보낸 파일에 감정 점수가 이미 있으면 분석 생략 (점수는 분석 결과와 같은 범위로 보정)
+    키워드가 목록/문자열이 아니면 None → 다시 분석
+    """
+    try:
+        analyzed = {k: int(float(record[k])) for k in EMOTION_KEYS}
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None
+    for key, (low, high) in RESPONSE_RANGES['sentiment'].items():
+        analyzed[key] = min(high, max(low, analyzed[key]))
+    keywords = record.get("keywords") or []
+    if isinstance(keywords, str):
+        try:
+            parsed = json.loads(keywords)
+        except ValueError:
+            parsed = None
+        keywords = parsed if isinstance(parsed, list) else [k.strip() for k in keywords.split(",") if k.strip()]
+    if not isinstance(keywords, list):
+        return None
+    analyzed["keywords"] = [str(k) for k in keywords]
+    return analyzed
+
+@st.cache_resource
+def get_import_executor():
+    """가져오기 전용 스레드 풀 - 긴 가져오기가 다른 세션의 LLM 작업 풀을 차지하지 않도록 분리"""
+    return ThreadPoolExecutor(max_workers=max(1, IMPORT_MAX_CONCURRENCY), thread_name_prefix="import")
+
+def run_diary_import(uploaded_file, file_format, existing_dates, overwrite=False, restart=False, on_progress=None,
+                     rescore=False):
+    """
+    과거 일기 가져오기
+    IMPORT_BATCH_SIZE개씩 읽어 여러 일기를 묶은 감정 분석 요청을 동시에 보내고(분당 IMPORT_RATE_LIMIT 제한),
+    IMPORT_WRITE_CHUNK행마다 한 번에 저장한 뒤 체크포인트 기록 → 중단돼도 같은 파일로 이어서 진행
+    쓰기 지연 저장소면 체크포인트 전에 실제 저장소까지 반영 (체크포인트 = 저장 완료)
+    rescore=True: 파일의 점수와 분석 캐시를 쓰지 않고 모두 다시 분석
+    """
+    fingerprint = file_fingerprint(uploaded_file)
+    checkpoint = None if restart else load_import_checkpoint(fingerprint)
+    if checkpoint is None:
+        checkpoint = {'file': getattr(uploaded_file, 'name', ''), 'offset': 0, 'imported': 0,
+                      'skipped': 0, 'failed': [], 'completed': False}
+    if checkpoint['completed']:
+        return checkpoint
+    
+    limiter = RateLimiter(IMPORT_RATE_LIMIT)
+    executor = get_import_executor()
+    
+    def analyze(contents):
+        return sentiment_analysis_batch(contents, before_request=limiter.acquire, use_cache=not rescore)
+    
+    seen = set()
+    buffer = []  # [(date_str, item_data)]
+    buffer_end = checkpoint['offset']  # 버퍼까지 반영하면 도달하는 레코드 위치
+    batch = []  # [(레코드 위치, date_str, record)]
+    
+    def flush():
+        nonlocal buffer
+        if buffer:
+            storage.upsert_diary_many(buffer)
+            for date_str, item_data in buffer:
+                notify_diary_change(date_str, item_data)
+            checkpoint['imported'] += len(buffer)
+            buffer = []
+            flush_storage = getattr(storage, 'flush', None)
+            if flush_storage is not None and not flush_storage():
+                # 저널에는 남아 있으므로 잃지는 않음 - 체크포인트만 앞으로 옮기지 않음
+                raise RuntimeError(f"저장소 반영 실패: {storage.stats['last_error']}")
+        checkpoint['offset'] = buffer_end
+        save_import_checkpoint(fingerprint, checkpoint)
+    
+    def run_batch():
+        nonlocal buffer_end
+        to_analyze = []
+        for position, date_str, record in batch:
+            analyzed = None if rescore else _prescored(record)
+            if analyzed:
+                buffer.append((date_str, _import_item(record, analyzed)))
+            else:
+                to_analyze.append((date_str, record))
+        # 묶음 요청 단위로 나눠 동시에 분석
+        chunks = [to_analyze[i:i + SENTIMENT_BATCH_MAX_ENTRIES]
+                  for i in range(0, len(to_analyze), SENTIMENT_BATCH_MAX_ENTRIES)]
+        futures = [executor.submit(analyze, [str(record["content"]) for _, record in chunk]) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            for (date_str, record), analyzed in zip(chunk, future.result()):
+                if analyzed is None:
+                    checkpoint['failed'].append(date_str)
+                else:
+                    buffer.append((date_str, _import_item(record, analyzed)))
+        buffer_end = batch[-1][0] + 1
+        batch.clear()
+        if len(buffer) >= IMPORT_WRITE_CHUNK:
+            flush()
+        if on_progress:
+            on_progress(checkpoint, buffer_end)
+    
+    for position, record in enumerate(iter_import_records(uploaded_file, file_format)):
+        if position < checkpoint['offset']:
+            continue
+        date_str = normalize_import_date(record.get("date"))
+        content = record.get("content")
+        if not date_str or not content or date_str in seen or (date_str in existing_dates and not overwrite):
+            checkpoint['skipped'] += 1
+            if not batch:
+                buffer_end = position + 1
+            continue
+        seen.add(date_str)
+        batch.append((position, date_str, record))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            run_batch()
+    if batch:
+        run_batch()
+    checkpoint['completed'] = True
+    flush()
+    invalidate_diary_snapshot()
+    return checkpoint
+
 # 메인 화면
 st.title("📱 감정 일기")
+cancel_stale_llm_tasks()
 
 # 🔍 클로바 API 상태 진단
 with st.expander("🔧 클로바 API 진단", expanded=True):
@@ -927,7 +3647,7 @@ if CLOVA_ENABLED:
     api_status.append("🎤 클로버 95%")
 if HUGGINGFACE_ENABLED:
     api_status.append("🎨 Hugging Face")
-status_text = " | ".join(["AI 분석", "☁️ 클라우드"] + api_status)
+status_text = " | ".join(["AI 분석", STORAGE_LABEL] + api_status)
 st.caption(status_text)
 
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["✍️ 쓰기", "📊 통계", "📈 그래프", "👨‍⚕️ 전문가", "📊 비교"])
@@ -950,7 +3670,7 @@ with tab1:
     diary_exists = date_str in data
     
     if data:
-        st.success(f"☁️ {len(data)}개 저장")
+        st.success(f"{STORAGE_LABEL} {len(data)}개 저장")
     
     st.divider()
     
@@ -976,22 +3696,40 @@ with tab1:
         
         with col_v1:
             audio_file = st.audio_input("🎙️ 녹음")
+        convert_clicked = False
         with col_v2:
             if audio_file is not None:
-                if st.button("📝 변환", use_container_width=True, type="primary", key=f"convert_{date_str}"):
-                    with st.spinner("🤖 변환 중..."):
-                        text = clova_speech_to_text(audio_file)
-                        if not text.startswith("❌"):
-                            st.success("✅ 완료!")
-                            # 변환된 텍스트를 세션에 저장
-                            st.session_state.voice_text = text
-                            st.rerun()
-                        else:
-                            st.error(text)
+                convert_clicked = st.button("📝 변환", use_container_width=True, type="primary", key=f"convert_{date_str}")
+        
+        if convert_clicked:
+            # 긴 녹음은 조각별 결과를 받는 대로 보여줌
+            partial_area = st.empty()
+            
+            def show_partial(partial, done, total):
+                partial_area.text_area(
+                    f"🎧 변환 중... ({done}/{total})", value=partial, height=150, disabled=True
+                )
+            
+            with st.spinner("🤖 변환 중..."):
+                text, stt_errors = clova_speech_to_text(audio_file, on_partial=show_partial)
+            partial_area.empty()
+            if text is not None:
+                st.success("✅ 완료!")
+                # 변환된 텍스트를 세션에 저장 (일부 구간 실패는 rerun 후에도 경고로 표시)
+                st.session_state.voice_text = text
+                st.session_state.voice_errors = stt_errors
+                st.rerun()
+            else:
+                st.error(stt_errors[0] if stt_errors else "❌ 변환 실패")
         
         # 변환된 텍스트 표시 및 추가/삭제 버튼
         if 'voice_text' in st.session_state and st.session_state.voice_text:
             st.success(f"🎤 {st.session_state.voice_text}")
+            if st.session_state.get('voice_errors'):
+                st.warning(
+                    "⚠️ 일부 구간을 변환하지 못해 […]로 표시했습니다:\n" +
+                    "\n".join(f"- {message}" for message in st.session_state.voice_errors)
+                )
             col_a, col_c = st.columns(2)
             
             with col_a:
@@ -1073,6 +3811,10 @@ with tab1:
                 st.rerun()
         save_clicked = False
     
+    # 저장 후 rerun되므로 분석 실패 안내는 세션에 남겨 한 번 표시
+    if st.session_state.get('save_warning'):
+        st.warning(st.session_state.pop('save_warning'))
+    
     # 💾 저장 처리
     if save_clicked:
         # 세션에서 최신 내용 가져오기
@@ -1081,8 +3823,13 @@ with tab1:
         if final_content.strip():
             with st.spinner('🤖 분석 중...'):
                 try:
-                    analyzed = sentiment_analysis(final_content)
+                    # 감정 분석(LLM)이 도는 동안 최근 기록을 함께 불러옴
+                    sentiment_future = submit_llm_task(sentiment_analysis, final_content, fallback=False)
                     data, items = get_latest_data()
+                    analyzed = wait_llm_task(sentiment_future)
+                    if analyzed is None:
+                        st.session_state.save_warning = "⚠️ 감정 분석에 실패해 기본 점수로 저장했습니다. 다시 저장하면 재분석합니다."
+                        analyzed = dict(SENTIMENT_FALLBACK)
                     
                     today_data = {
                         "date": date_str, 
@@ -1104,7 +3851,10 @@ with tab1:
                         "calmness": i["calmness"]
                     } for i in items[-7:]]
                     
-                    message = generate_message(today_data, recent_data)
+                    message = wait_llm_task(
+                        submit_llm_task(generate_message, today_data, recent_data),
+                        default=MESSAGE_FALLBACK
+                    )
                     
                     new_item = {
                         "date": date_str, 
@@ -1163,49 +3913,73 @@ with tab1:
             st.info("💡 일기를 쓰면 AI가 분석!")           
 with tab2:
     st.subheader("📊 통계")
-    data, items = get_latest_data()
+    frame = get_diary_frame().tail(30)
     
-    if not items:
+    if not len(frame):
         st.info("📝 첫 일기를 써보세요!")
     else:
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("📈 평균", f"{calc_average_total_score(items)}점")
-            st.metric("✏️ 글자", f"{calc_char_count(items):,}자")
+            st.metric("📈 평균", f"{calc_average_total_score(frame)}점")
+            st.metric("✏️ 글자", f"{calc_char_count(frame):,}자")
         with col2:
-            st.metric("📚 일기", f"{len(items)}개")
-            st.metric("📅 월", f"{len(set([i['date'][:7] for i in items]))}개월")
+            st.metric("📚 일기", f"{len(frame)}개")
+            st.metric("📅 월", f"{frame.month_count()}개월")
         
         st.divider()
         st.write("🏷️ **키워드 TOP 10**")
-        kw = calc_keyword_count(items)
-        if kw:
-            sorted_kw = sorted(kw.items(), key=lambda x: x[1], reverse=True)[:10]
+        keyword_index = get_keyword_index()
+        start, end = frame.dates[0], frame.dates[-1]
+        sorted_kw = keyword_index.top_k(10, start, end)
+        if sorted_kw:
             for i, (k, c) in enumerate(sorted_kw):
                 if i < 3:
                     st.markdown(f"### {['🥇','🥈','🥉'][i]} **{k}** `{c}회`")
                 else:
                     st.markdown(f"**{i+1}.** {k} `{c}회`")
+            
+            # 키워드 살펴보기 (전체 기간)
+            focus = st.selectbox("🔎 키워드 살펴보기", options=[k for k, _ in sorted_kw], key="keyword_focus")
+            together = keyword_index.co_occurrence(focus, 5)
+            if together:
+                st.caption("🤝 함께 나온 키워드: " + " · ".join(f"{k} {c}회" for k, c in together))
+            mentioned = keyword_index.dates_for(focus)
+            st.caption(f"📅 {len(mentioned)}일 언급 · 최근: " + ", ".join(reversed(mentioned[-5:])))
 
 with tab3:
     st.subheader("📈 그래프")
-    data, items = get_latest_data()
+    full_frame = get_diary_frame()
+    frame = full_frame.tail(14)
     
-    if not items:
+    if not len(frame):
         st.info("📝 일기 2개 이상 필요")
     else:
+        dates = [d[5:] for d in frame.dates]
         st.write("**🎯 감정 점수**")
-        scores = [{"날짜": i["date"][5:], "점수": i["total_score"]} for i in items[-14:]]
-        st.line_chart(scores, x="날짜", y="점수", height=250)
+        # 표시 구간 앞의 일기까지 포함해 각 날짜마다 최근 7개 이동 평균
+        window = min(7, len(full_frame))
+        _, rolling_total = full_frame.tail(len(frame) + window - 1).rolling_mean(window)
+        rolling_total = np.concatenate([np.full(len(frame) - len(rolling_total), np.nan), rolling_total])  # 앞쪽 일기가 부족한 날짜는 비움
+        scores = {"날짜": dates, "점수": frame.total, f"{window}개 이동 평균": rolling_total}
+        st.line_chart(scores, x="날짜", y=["점수", f"{window}개 이동 평균"], height=250)
         
         st.write("**🎭 감정별 변화**")
-        emo = [{"날짜": i["date"][5:], "😄기쁨": i["joy"], "😌평온": i["calmness"],
-               "😰불안": i["anxiety"], "😢슬픔": i["sadness"], "😡분노": i["anger"]} for i in items[-14:]]
+        emo = {"날짜": dates, "😄기쁨": frame.emotion('joy'), "😌평온": frame.emotion('calmness'),
+               "😰불안": frame.emotion('anxiety'), "😢슬픔": frame.emotion('sadness'), "😡분노": frame.emotion('anger')}
         st.area_chart(emo, x="날짜", y=["😄기쁨", "😌평온", "😰불안", "😢슬픔", "😡분노"], height=250)
+        
+        st.write("**📅 장기 추이**")
+        unit = st.radio("단위", ["주별", "월별"], horizontal=True, key="rollup_unit", label_visibility="collapsed")
+        resolution, periods = ('week', 52) if unit == "주별" else ('month', 24)
+        labels, means = get_diary_rollups().means(resolution, periods)
+        trend = {"기간": labels, "평균 점수": means['total'], "😄기쁨": means['joy'], "😢슬픔": means['sadness']}
+        st.line_chart(trend, x="기간", y=["평균 점수", "😄기쁨", "😢슬픔"], height=250)
+        st.caption(f"최근 {len(labels)}{'주' if resolution == 'week' else '개월'} · 일기 {int(means['count'].sum())}개")
 
 with tab4:
     st.subheader("👨‍⚕️ 전문가")
     data, items = get_latest_data()
+    frame = get_diary_frame().tail(30)
     
     if not items:
         st.info("📝 일기 필요")
@@ -1213,23 +3987,35 @@ with tab4:
         st.success(f"📊 {len(items)}개 분석")
         
         dates = sorted([i['date'] for i in items], reverse=True)
+        preload_expert_advice(dates)
         sel_date = st.selectbox("📅 날짜", options=dates, index=0)
         saved = load_expert_advice_from_sheets(sel_date)
         
         if saved:
             st.info(f"💾 저장된 조언: {len(saved)}개")
         
-        st.divider()
-        
-        tabs = st.tabs(["🧠 심리", "💰 재정", "⚖️ 법률", "🏥 의사", "✨ 피부", "💪 운동", "🚀 창업", "🎨 예술", "🧬 임상", "👔 조직"])
         experts = [("심리상담사", "🧠", True), ("재정관리사", "💰", False), ("변호사", "⚖️", False), 
                   ("의사", "🏥", False), ("피부관리사", "✨", False), ("피트니스 트레이너", "💪", False),
                   ("창업 벤처투자자", "🚀", True), ("예술치료사", "🎨", False), ("임상심리사", "🧬", True), 
                   ("조직심리 전문가", "👔", False)]
+        expert_names = [name for name, _, _ in experts]
+        
+        # 여러 전문가 조언을 한 번에 (결과는 아래 각 탭에 도착하는 대로 표시)
+        with st.expander("⚡ 여러 전문가 조언 한 번에 받기"):
+            batch_selected = st.multiselect("전문가 선택", options=expert_names, default=expert_names, key="batch_experts")
+            batch_clicked = st.button("🚀 한 번에 받기", use_container_width=True, key="batch_advice",
+                                      disabled=not batch_selected)
+            batch_status = st.empty()
+        
+        st.divider()
+        
+        tabs = st.tabs(["🧠 심리", "💰 재정", "⚖️ 법률", "🏥 의사", "✨ 피부", "💪 운동", "🚀 창업", "🎨 예술", "🧬 임상", "👔 조직"])
+        batch_slots = {}
         
         for idx, (name, icon, chart) in enumerate(experts):
             with tabs[idx]:
                 st.markdown(f"### {icon} {name}")
+                batch_slots[name] = st.empty()
                 
                 if name in saved:
                     st.success(f"📋 {saved[name]['created_at'][:10]}")
@@ -1237,21 +4023,27 @@ with tab4:
                     st.divider()
                 
                 if st.button(f"💬 {name} 조언", key=f"b_{name}", use_container_width=True):
+                    # 차트/이미지를 그리는 동안 조언 요청을 미리 보내둠
+                    advice_request = build_llm_request(get_expert_context(data), expert_suffix(name))
+                    advice_future = submit_llm_task(request_expert_advice, *advice_request)
+                    
                     if chart and len(items) >= 2:
                         if name in ["심리상담사", "임상심리사"]:
-                            flow = create_emotion_flow_chart(items)
+                            flow = create_emotion_flow_chart(frame)
                             if flow:
                                 st.image(flow, caption="Emotion Flow", use_container_width=True)
-                            net = create_emotion_network(items)
+                            net = create_emotion_network(
+                                get_diary_frame(), get_correlation_engine(EMOTION_NETWORK_WINDOW).matrix()
+                            )
                             if net:
                                 st.image(net, caption="Network", use_container_width=True)
                         elif name == "창업 벤처투자자":
-                            goal = create_goal_flowchart(items)
+                            goal = create_goal_flowchart(frame)
                             if goal:
                                 st.image(goal, caption="Goal", use_container_width=True)
                     
                     if name == "예술치료사":
-                        metaphor_text, emotion, emotions_summary = create_metaphor_prompt(items)
+                        metaphor_text, emotion, emotions_summary = create_metaphor_prompt(frame)
                         st.info(f"🎨 **메타포:** {metaphor_text}")
                         
                         # 저장된 이미지 확인
@@ -1260,8 +4052,7 @@ with tab4:
                         if saved_img:
                             st.success("💾 저장된 이미지 표시")
                             try:
-                                img_data = base64.b64decode(saved_img)
-                                st.image(img_data, caption="Metaphor Image", use_container_width=True)
+                                st.image(saved_img, caption="Metaphor Image", use_container_width=True)
                                 
                                 # 재생성 버튼
                                 if st.button("🔄 새 이미지 생성", key="regenerate_img", use_container_width=True):
@@ -1274,7 +4065,9 @@ with tab4:
                         
                         # 새 이미지 생성 (저장된 이미지가 없거나 재생성 요청 시)
                         if not saved_img or st.session_state.get('force_regenerate', False):
-                            if st.session_state.get('force_regenerate', False):
+                            # 재생성 요청이면 같은 프롬프트라도 캐시된 이미지를 쓰지 않음
+                            regenerate = st.session_state.get('force_regenerate', False)
+                            if regenerate:
                                 st.session_state.force_regenerate = False
                             
                             # 이미지 생성 방법 선택
@@ -1308,7 +4101,7 @@ with tab4:
                                         st.info("📌 Pollinations.ai는 완전 무료이며 API 키가 필요없습니다!")
                                     
                                     # Pollinations로 이미지 생성
-                                    img_base64, error = generate_image_with_pollinations(prompt)
+                                    img_base64, error = generate_image_with_pollinations(prompt, use_cache=not regenerate)
                                     
                                     if img_base64:
                                         try:
@@ -1340,7 +4133,7 @@ with tab4:
                             else:
                                 # Hugging Face 사용
                                 if HUGGINGFACE_ENABLED:
-                                    with st.spinner("🤗 Hugging Face AI로 이미지 생성 중... (여러 모델 시도, 최대 60초)"):
+                                    with st.spinner("🤗 Hugging Face AI로 이미지 생성 중... (여러 모델 동시 시도, 최대 60초)"):
                                         # 최근 일기에서 키워드 추출
                                         recent_keywords = []
                                         for item in items[-7:]:
@@ -1358,7 +4151,9 @@ with tab4:
                                             st.caption(f"시도할 모델: {', '.join(HUGGINGFACE_MODELS)}")
                                         
                                         # 이미지 생성
-                                        img_base64, error = generate_image_with_huggingface(prompt, negative_prompt, debug_mode=debug_mode)
+                                        img_base64, error = generate_image_with_huggingface(
+                                            prompt, negative_prompt, debug_mode=debug_mode, use_cache=not regenerate
+                                        )
                                         
                                         if img_base64:
                                             try:
@@ -1414,7 +4209,8 @@ with tab4:
                                     """)
                                     st.code('HUGGINGFACE_API_KEY = "hf_..."', language="toml")
                     
-                    result = get_expert_advice(name, data)
+                    with st.spinner(f'🤖 {name} 분석 중...'):
+                        result = wait_llm_task(advice_future, default=dict(ADVICE_FALLBACK))
                     if result.get("has_content"):
                         st.success(f"**{name} 조언:**")
                         st.markdown(result["advice"])
@@ -1423,20 +4219,72 @@ with tab4:
                     else:
                         st.info(result["advice"])
         
+        if batch_clicked:
+            for name in batch_selected:
+                batch_slots[name].info("⏳ 분석 중...")
+            finished = []
+            
+            def show_batch_result(name, result):
+                finished.append(name)
+                batch_status.caption(f"⏳ {len(finished)}/{len(batch_selected)} 완료")
+                with batch_slots[name].container():
+                    if result.get("has_content"):
+                        st.success(f"**{name} 조언:**")
+                        st.markdown(result["advice"])
+                    else:
+                        st.info(result["advice"])
+            
+            with st.spinner(f"🤖 전문가 {len(batch_selected)}명 분석 중..."):
+                batch_results = stream_expert_advice_batch(batch_selected, data, show_batch_result)
+            
+            to_save = {name: result for name, result in batch_results.items() if result.get("has_content")}
+            if not to_save:
+                batch_status.info("💡 저장할 조언이 없습니다.")
+            elif save_expert_advice_batch(sel_date, to_save):
+                batch_status.success(f"💾 {len(to_save)}개 조언 저장!")
+            else:
+                batch_status.warning("⚠️ 조언 저장 실패")
+        
         st.divider()
         st.warning("⚠️ AI 조언은 참고용. 전문가 상담 필요 시 반드시 전문의와 상담하세요.")
 
 with tab5:
     st.subheader("📊 기간별 비교")
-    data, items = get_latest_data()
+    frame = get_diary_frame()
     
-    if len(items) < 14:
-        st.info("📝 14개 일기 필요")
+    if len(frame) < 2:
+        st.info("📝 일기 2개 이상 필요")
     else:
-        comp = compare_periods(items)
+        window_options = {name: label for name, (label, _, _) in PERIOD_WINDOWS.items()}
+        window_options['custom'] = '직접 선택'
+        window = st.selectbox(
+            "비교 구간", options=list(window_options), format_func=window_options.get, key="compare_window"
+        )
         
-        if comp:
-            st.write("**📈 최근 vs 이전 (1주)**")
+        if window == 'custom':
+            first_day = datetime.strptime(frame.dates[0][:10], "%Y-%m-%d").date()
+            last_day = datetime.strptime(frame.dates[-1][:10], "%Y-%m-%d").date()
+            col_r, col_p = st.columns(2)
+            with col_r:
+                recent_range = st.date_input("최근 구간", value=(last_day, last_day),
+                                             min_value=first_day, max_value=last_day, key="compare_recent")
+            with col_p:
+                previous_range = st.date_input("이전 구간", value=(first_day, first_day),
+                                               min_value=first_day, max_value=last_day, key="compare_previous")
+            if len(recent_range) == 2 and len(previous_range) == 2:
+                comp = compare_periods(frame, current=tuple(map(str, recent_range)),
+                                       previous=tuple(map(str, previous_range)))
+            else:
+                comp = None
+        else:
+            comp = compare_periods(frame, window)
+        
+        if not comp:
+            st.info("📝 두 구간 모두 일기가 있어야 비교할 수 있어요")
+        else:
+            meta = comp['_meta']
+            st.write(f"**📈 {meta['current'][0]} ~ {meta['current'][1]} ({meta['n_recent']}개) vs "
+                     f"{meta['previous'][0]} ~ {meta['previous'][1]} ({meta['n_previous']}개)**")
             
             emotion_map = {
                 'joy': ('😄', '기쁨'),
@@ -1457,9 +4305,11 @@ with tab5:
                     with col1:
                         st.metric(f"{emoji} {name}", f"{d['recent']:.1f}", f"{d['diff']:+.1f}")
                     with col2:
-                        st.caption(f"이전: {d['previous']:.1f}")
+                        st.caption(f"이전: {d['previous']:.1f} · 분산 {d['recent_var']:.1f}/{d['previous_var']:.1f}")
                     with col3:
-                        st.caption(f"{trend} {d['trend']}")
+                        st.caption(f"{trend} {d['trend']}" + (" ✳️" if d['significant'] else ""))
+            
+            st.caption("✳️ 두 구간 차이가 통계적으로 뚜렷함 (|t| ≥ 2)")
             
             st.divider()
             
@@ -1473,8 +4323,118 @@ with tab5:
                 st.info(f"➡️ 종합 유지")
 
 st.divider()
+# 📥 과거 일기 가져오기
+with st.expander("📥 과거 일기 가져오기", expanded=False):
+    st.caption("JSONL(한 줄에 {\"date\": \"2024-01-31\", \"content\": \"...\"}), 같은 객체의 JSON 배열, 또는 date, content 열이 있는 CSV")
+    import_file = st.file_uploader("파일 선택", type=["jsonl", "json", "csv"], key="import_file")
+    col_i1, col_i2 = st.columns(2)
+    with col_i1:
+        import_overwrite = st.checkbox("기존 날짜 덮어쓰기", value=False, key="import_overwrite")
+    with col_i2:
+        import_restart = st.checkbox("처음부터 다시", value=False, key="import_restart",
+                                     help="이전 가져오기 기록(체크포인트)을 무시")
+    import_rescore = st.checkbox("감정 다시 분석", value=False, key="import_rescore",
+                                 help="파일의 점수와 저장된 분석 결과를 쓰지 않고 모두 다시 분석 (기존 날짜 덮어쓰기와 함께 사용)")
+    if import_file is not None and st.button("📥 가져오기 시작", use_container_width=True, key="import_start"):
+        import_format = os.path.splitext(import_file.name.lower())[1].lstrip(".")
+        import_format = import_format if import_format in ("csv", "json") else "jsonl"
+        import_progress = st.empty()
+        
+        def show_import_progress(checkpoint, position):
+            import_progress.caption(
+                f"⏳ {position}행 처리 · 저장 {checkpoint['imported']} · 건너뜀 {checkpoint['skipped']} · "
+                f"실패 {len(checkpoint['failed'])}"
+            )
+        
+        with st.spinner("🤖 감정 분석 및 저장 중..."):
+            try:
+                result = run_diary_import(
+                    import_file, import_format, set(get_diary_snapshot()),
+                    overwrite=import_overwrite, restart=import_restart, on_progress=show_import_progress,
+                    rescore=import_rescore
+                )
+            except Exception as e:
+                result = None
+                st.error(f"가져오기 중단: {e} (다시 시작하면 이어서 진행)")
+        if result:
+            import_progress.empty()
+            st.success(f"✅ 저장 {result['imported']}개 · 건너뜀 {result['skipped']}개 · 실패 {len(result['failed'])}개")
+            if result['failed']:
+                st.warning("분석 실패한 날짜: " + ", ".join(result['failed'][:20]))
+
+st.divider()
+# ⚡ 성능 진단
+with st.expander("⚡ 성능 진단", expanded=False):
+    startup_text = " · ".join(f"{label} {ms:.1f}ms" for label, ms in startup_timings.items())
+    st.caption(f"⏱️ 이번 실행: {startup_text} | 전체 {(time.perf_counter() - RERUN_STARTED_AT) * 1000:.0f}ms")
+    init_text = " · ".join(f"{step} {ms:.0f}ms" for step, ms in gemini_setup['timings'].items())
+    st.caption(
+        f"🤖 모델 {gemini_setup['model_name']} ({gemini_setup['source']}) | "
+        f"최초 초기화 {gemini_setup['loaded_at']}: {init_text}"
+    )
+    snapshot_stats = get_diary_snapshot_stats()
+    st.caption(
+        f"📦 일기 스냅샷 v{snapshot_stats['version']} | "
+        f"적중 {snapshot_stats['hits']} · 미스 {snapshot_stats['misses']} · 무효화 {snapshot_stats['invalidations']}"
+    )
+    if WRITE_BEHIND_ENABLED:
+        wb_stats = storage.stats
+        st.caption(
+            f"📝 쓰기 대기 {storage.pending_count()}건 | 반영 {wb_stats['flushed']}건 "
+            f"({wb_stats['flushes']}회) · 실패 {wb_stats['failures']}회 · 마지막 반영 {wb_stats['last_flush_at'] or '-'}"
+        )
+        if wb_stats['last_error']:
+            st.warning(f"⚠️ 저장 재시도 중: {wb_stats['last_error']}")
+    for endpoint, m in http_client.metrics_summary().items():
+        st.caption(
+            f"🌐 {endpoint} {m['count']}회 | 평균 {m['avg_ms']:.0f}ms · p95 {m['p95_ms']:.0f}ms · "
+            f"최대 {m['max_ms']:.0f}ms · 오류 {m['errors']} · 재시도 {m['retries']}"
+        )
+    st.caption(
+        f"👨‍⚕️ 조언 저장소 {len(expert_advice_store)}일 | "
+        f"적중 {expert_advice_store.stats['hits']} · 조회 {expert_advice_store.stats['loads']}"
+    )
+    prompt_context = st.session_state.get('_prompt_context')
+    if prompt_context is not None:
+        pc_stats = _prompt_context_stats()
+        gemini_cache = "사용" if prompt_context.get('cached_model') is not None else "미사용"
+        st.caption(
+            f"🧾 전문가 프롬프트 요약 v{prompt_context['version']} · 약 {prompt_context['tokens']:,}토큰 | "
+            f"재사용 {pc_stats['hits']} · 생성 {pc_stats['builds']} · Gemini 캐시 {gemini_cache}"
+        )
+    for kind, counters in llm_json_stats.by_kind.items():
+        st.caption(
+            f"🧩 JSON 응답 [{kind}] 호출 {counters['calls']} | 정상 {counters['ok']} · 복구 {counters['repaired']} · "
+            f"재요청 {counters['retries']} · 파싱 실패 {counters['parse_failures']} · 포기 {counters['failed']} · "
+            f"호출 오류 {counters['call_errors']}"
+        )
+    batch_stats = llm_json_stats.batch
+    if batch_stats['requests'] or batch_stats['fallbacks']:
+        st.caption(
+            f"📦 묶음 감정 분석 요청 {batch_stats['requests']}회 · 일기 {batch_stats['entries']}개 | "
+            f"분할 {batch_stats['splits']} · 개별 재분석 {batch_stats['fallbacks']}"
+        )
+    cc_stats = chart_cache.stats
+    st.caption(
+        f"📊 차트 캐시 {len(chart_cache)}/{chart_cache.max_entries}개 | "
+        f"적중 {cc_stats['hits']} · 렌더링 {cc_stats['misses']} ({cc_stats['render_ms']:.0f}ms) · 제거 {cc_stats['evictions']}"
+    )
+    if image_cache is not None:
+        ic_stats = image_cache.stats
+        st.caption(
+            f"🖼️ 이미지 캐시 {len(image_cache)}개 · {image_cache.total_bytes / 1024 / 1024:.1f}/"
+            f"{image_cache.max_bytes / 1024 / 1024:.0f}MB | "
+            f"적중 {ic_stats['hits']} · 미스 {ic_stats['misses']} · 제거 {ic_stats['evictions']}"
+        )
+    if sentiment_cache is not None:
+        sc_stats = sentiment_cache.stats
+        st.caption(
+            f"🧠 감정 분석 캐시 {len(sentiment_cache)}/{sentiment_cache.max_entries}건 | "
+            f"적중 {sc_stats['hits']} · 미스 {sc_stats['misses']} · 제거 {sc_stats['evictions']}"
+        )
+
 st.markdown("### 💝 매일 감정 기록")
-footer_items = ["🤖 AI", "☁️ 클라우드"]
+footer_items = ["🤖 AI", STORAGE_LABEL]
 if CLOVA_ENABLED:
     footer_items.append("🎤 클로버 95%")
 footer_items.append("🎨 Pollinations (무료)")